@@ -1,8 +1,9 @@
 from flask import Flask, request, abort
-import json
+import os
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from auth_cache import KeyStore, TokenCache
 
 
 app = Flask(__name__)
@@ -11,6 +12,19 @@ AUTH0_DOMAIN = 'jaimeam.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'test'
 
+# Signing keys, fetched in the background and cached for JWKS_TTL seconds;
+# a request waits JWKS_WAIT seconds at most for them
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+JWKS_TTL = int(os.environ.get('JWKS_TTL', 600))
+JWKS_WAIT = float(os.environ.get('JWKS_WAIT', 1))
+
+jwks = KeyStore(JWKS_URL, ttl=JWKS_TTL, wait=JWKS_WAIT)
+
+# Payloads of already verified tokens, kept until the token expires
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+verified_tokens = TokenCache(TOKEN_CACHE_SIZE)
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -52,8 +66,6 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
@@ -62,15 +74,15 @@ def verify_decode_jwt(token):
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    key = jwks.get(unverified_header['kid'])
+    if key:
+        rsa_key = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -109,10 +121,13 @@ def requires_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = get_token_auth_header()
-        try:
-            payload = verify_decode_jwt(token)
-        except:
-            abort(401)
+        payload = verified_tokens.get(token)
+        if payload is None:
+            try:
+                payload = verify_decode_jwt(token)
+            except:
+                abort(401)
+            payload = verified_tokens.put(token, payload)
         return f(payload, *args, **kwargs)
 
     return wrapper
@@ -0,0 +1,81 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.request import urlopen
+
+
+class KeyStore:
+    """Signing keys of a JWKS url by kid, fetched again after ttl seconds
+    or for an unknown kid. One fetch at a time runs in a background thread;
+    a request waits for it wait seconds at most, then uses the last keys
+    fetched
+    """
+
+    def __init__(self, url, ttl=600, wait=1):
+        self.url = url
+        self.ttl = ttl
+        self.wait = wait
+        self._keys = {}
+        self._fetched_at = None
+        self._fetch = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            with urlopen(self.url, timeout=10) as response:
+                keys = {key['kid']: key for key in json.loads(response.read())['keys']}
+        except Exception:
+            # the last keys fetched stay in use
+            return
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def get(self, kid):
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return key
+            if self._fetch is None or not self._fetch.is_alive():
+                self._fetch = threading.Thread(target=self._refresh, daemon=True)
+                self._fetch.start()
+            fetch = self._fetch
+        if key is not None:
+            # expired keys are used while they are fetched again
+            return key
+        fetch.join(self.wait)
+        with self._lock:
+            return self._keys.get(kid)
+
+
+class TokenCache:
+    """Payloads of verified tokens by SHA-256 of the token, the least
+    recently used dropped beyond size, each kept until the token's exp
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is None or time.time() >= entry[0]:
+                self._payloads.pop(key, None)
+                return None
+            self._payloads.move_to_end(key)
+            return entry[1]
+
+    def put(self, token, payload):
+        if isinstance(payload.get('exp'), (int, float)) and self.size > 0:
+            key = hashlib.sha256(token.encode('utf-8')).digest()
+            with self._lock:
+                self._payloads[key] = (payload['exp'], payload)
+                self._payloads.move_to_end(key)
+                while len(self._payloads) > self.size:
+                    self._payloads.popitem(last=False)
+        return payload
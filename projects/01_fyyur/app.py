@@ -13,7 +13,8 @@ from flask import (
   flash,
   redirect,
   url_for,
-  jsonify
+  jsonify,
+  abort
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
@@ -22,18 +23,35 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
+import io
 import sys
-import datetime
-from sqlalchemy.sql import func
+import click
 
 #Import models and SQLAlchemy connection
 from models import (
   Venue,
   Artist,
   Show,
+  Genre,
   app,
   db
 )
+from queries import (
+  venue_areas,
+  artist_list,
+  venue_page,
+  artist_page,
+  upcoming_show_counts,
+  show_page,
+  decode_show_cursor
+)
+from search import search
+from conditional import table_versions
+from pool import metrics
+from profiler import QueryProfiler
+from cache import page_cache
+import counters
+from ingest import ingest, KINDS as INGEST_KINDS
 
 #----------------------------------------------------------------------------#
 # Filters.
@@ -49,6 +67,19 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+table_versions.track()
+
+# SQL and connection pool metrics, see DB_METRICS_LOG / DB_METRICS_ENDPOINT
+metrics.init_app(app, db)
+# Per-request statement profiles, see SQL_PROFILER
+QueryProfiler().init_app(app)
+# Venue and artist pages, see CACHE_URL
+page_cache.init_app(app)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -62,81 +93,40 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@table_versions.conditional('venue', 'show')
 def venues():
-  data = []
-  locations = db.session.query(Venue.city,Venue.state).distinct().all()
-  for location in locations:
-    location_entry = {}
-    location_entry['city'] = location[0]
-    location_entry['state'] = location[1]
-    location_entry['venues'] = []
-    location_venues = Venue.query.filter(Venue.city==location[0],Venue.state==location[1]).all()
-    for venue in location_venues:
-      new_venue = {}
-      new_venue['id'] = venue.id
-      new_venue['name'] = venue.name
-      new_venue['num_upcoming_shows'] = Show.query.filter(Show.venue_id==venue.id,Show.start_time<datetime.datetime.today()).count()
-      location_entry['venues'].append(new_venue)
-    data.append(location_entry)
-
-  return render_template('pages/venues.html', areas=data)
+  # ?genre=<name> lists only the venues of that genre
+  return render_template('pages/venues.html', areas=venue_areas(request.args.get('genre')))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   search_term=request.form.get('search_term')
-  venue_matches_query = Venue.query.filter(func.lower(Venue.name).contains(search_term.lower())).all()
+  limit = app.config['SEARCH_RESULTS_LIMIT']
+  # one more match than shown tells whether the results were cut short
+  venue_matches_query = search(Venue, Venue.name, search_term, limit + 1, app.config['SEARCH_BACKEND'])
   
   response = {}
+  response['more'] = len(venue_matches_query) > limit
+  venue_matches_query = venue_matches_query[:limit]
   response['count'] = len(venue_matches_query)
   response['data'] = []
 
+  upcoming_counts = upcoming_show_counts(Show.venue_id, [venue_query.id for venue_query in venue_matches_query])
   for venue_query in venue_matches_query:
     venue_dict = {}
     venue_dict['id'] = venue_query.id
     venue_dict['name'] = venue_query.name
-    venue_dict['num_upcoming_shows'] = len(Show.query.filter(Show.venue_id==venue_dict['id'], Show.start_time>=datetime.datetime.today()).all())
+    venue_dict['num_upcoming_shows'] = upcoming_counts[venue_query.id]
     response['data'].append(venue_dict)
 
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-
-  data = {}
-  venue_query = Venue.query.get(venue_id)
-  data['id']=venue_query.id
-  data['name']=venue_query.name
-  data['genres']=venue_query.genres[1:-1].split(',')
-  data['address']=venue_query.address
-  data['city']=venue_query.city
-  data['state']=venue_query.state
-  data['phone']=venue_query.phone
-  data['website']=venue_query.website
-  data['facebook_link']=venue_query.facebook_link
-  data['seeking_talent']=venue_query.seeking_talent
-  data['seeking_description']=venue_query.seeking_description
-  data['image_link']=venue_query.image_link
-  data['past_shows']=[]
-  past_shows_query = Show.query.filter(Show.venue_id==venue_id, Show.start_time<datetime.datetime.today()).all()
-  for past_show_query in past_shows_query:
-    past_show = {}
-    past_show['artist_id'] = past_show_query.artist_id
-    past_show['artist_name'] = Artist.query.get(past_show['artist_id']).name
-    past_show['artist_image_link'] = Artist.query.get(past_show['artist_id']).image_link
-    past_show['start_time'] = str(past_show_query.start_time)
-    data['past_shows'].append(past_show)
-  data['upcoming_shows']=[]
-  upcoming_shows_query = Show.query.filter(Show.venue_id==venue_id, Show.start_time>=datetime.datetime.today()).all()
-  for upcoming_show_query in upcoming_shows_query:
-    upcoming_show = {}
-    upcoming_show['artist_id'] = upcoming_show_query.artist_id
-    upcoming_show['artist_name'] = Artist.query.get(upcoming_show['artist_id']).name
-    upcoming_show['artist_image_link'] = Artist.query.get(upcoming_show['artist_id']).image_link
-    upcoming_show['start_time'] = str(upcoming_show_query.start_time)
-    data['upcoming_shows'].append(upcoming_show)
-  data['past_shows_count']=len(data['past_shows'])
-  data['upcoming_shows_count']=len(data['upcoming_shows'])
+  # shows the venue page with the given venue_id, from the page cache
+  data = page_cache.get_or_build('venue', venue_id, lambda: venue_page(venue_id))
+  if data is None:
+    abort(404)
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -159,7 +149,7 @@ def create_venue_submission():
       address = form.address.data,
       phone = form.phone.data,
       image_link = form.image_link.data,
-      genres = form.genres.data,
+      genres = Genre.from_names(form.genres.data),
       facebook_link = form.facebook_link.data,
       website = form.website.data,
       seeking_talent = form.seeking_talent.data,
@@ -182,8 +172,11 @@ def create_venue_submission():
 def delete_venue(venue_id):
     error = False
     try:
+        cache_keys = page_cache.venue_keys(venue_id)
+        counters.uncount_shows(Show.venue_id==venue_id)
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
+        page_cache.delete(cache_keys)
         flash('The venue has been removed!')
     except:
         error = True
@@ -197,23 +190,20 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@table_versions.conditional('artist')
 def artists():
-
-  data = []
-  artists_query = Artist.query.all()
-  for artist in artists_query:
-    artist_dict={}
-    artist_dict['id']=artist.id
-    artist_dict['name']=artist.name
-    data.append(artist)
-  return render_template('pages/artists.html', artists=data)
+  # ?genre=<name> lists only the artists of that genre
+  return render_template('pages/artists.html', artists=artist_list(request.args.get('genre')))
 
 @app.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
     error = False
     try:
+        cache_keys = page_cache.artist_keys(artist_id)
+        counters.uncount_shows(Show.artist_id==artist_id)
         Artist.query.filter_by(id=artist_id).delete()
         db.session.commit()
+        page_cache.delete(cache_keys)
         flash('The artist has been removed!')
     except:
         error = True
@@ -227,59 +217,31 @@ def delete_artist(artist_id):
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   search_term=request.form.get('search_term')
-  artist_matches_query = Artist.query.filter(func.lower(Artist.name).contains(search_term.lower())).all()
+  limit = app.config['SEARCH_RESULTS_LIMIT']
+  # one more match than shown tells whether the results were cut short
+  artist_matches_query = search(Artist, Artist.name, search_term, limit + 1, app.config['SEARCH_BACKEND'])
   
   response = {}
+  response['more'] = len(artist_matches_query) > limit
+  artist_matches_query = artist_matches_query[:limit]
   response['count'] = len(artist_matches_query)
   response['data'] = []
 
+  upcoming_counts = upcoming_show_counts(Show.artist_id, [artist_query.id for artist_query in artist_matches_query])
   for artist_query in artist_matches_query:
     artist_dict = {}
     artist_dict['id'] = artist_query.id
     artist_dict['name'] = artist_query.name
-    artist_dict['num_upcoming_shows'] = len(Show.query.filter(Show.artist_id==artist_dict['id'], Show.start_time>=datetime.datetime.today()).all())
+    artist_dict['num_upcoming_shows'] = upcoming_counts[artist_query.id]
     response['data'].append(artist_dict)
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  data = {}
-  artist_query = Artist.query.get(artist_id)
-  data['id']=artist_query.id
-  data['name']=artist_query.name
-  data['genres']=artist_query.genres[1:-1].split(',')
-  data['city']=artist_query.city
-  data['state']=artist_query.state
-  data['phone']=artist_query.phone
-  data['website']=artist_query.website
-  data['facebook_link']=artist_query.facebook_link
-  data['seeking_venue']=artist_query.seeking_venue
-  data['seeking_description']=artist_query.seeking_description
-  data['image_link']=artist_query.image_link
-  data['past_shows']=[]
-  past_shows_query = Show.query.filter(Show.artist_id==artist_id, Show.start_time<datetime.datetime.today()).all()
-  for past_show_query in past_shows_query:
-    past_show = {}
-    past_show['venue_id'] = past_show_query.venue_id
-    past_show['venue_name'] = Venue.query.get(past_show['venue_id']).name
-    past_show['venue_image_link'] = Venue.query.get(past_show['venue_id']).image_link
-    past_show['start_time'] = str(past_show_query.start_time)
-    data['past_shows'].append(past_show)
-  data['upcoming_shows']=[]
-  upcoming_shows_query = Show.query.filter(Show.artist_id==artist_id, Show.start_time>=datetime.datetime.today()).all()
-  for upcoming_show_query in upcoming_shows_query:
-    upcoming_show = {}
-    upcoming_show['venue_id'] = upcoming_show_query.venue_id
-    upcoming_show['venue_name'] = Venue.query.get(upcoming_show['venue_id']).name
-    upcoming_show['venue_image_link'] = Venue.query.get(upcoming_show['venue_id']).image_link
-    upcoming_show['start_time'] = str(upcoming_show_query.start_time)
-    data['upcoming_shows'].append(upcoming_show)
-  data['past_shows_count']=len(data['past_shows'])
-  data['upcoming_shows_count']=len(data['upcoming_shows'])
-
-
-
+  # shows the artist page with the given artist_id, from the page cache
+  data = page_cache.get_or_build('artist', artist_id, lambda: artist_page(artist_id))
+  if data is None:
+    abort(404)
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -304,14 +266,16 @@ def edit_artist_submission(artist_id):
       'state' : form.state.data,
       'phone' : form.phone.data,
       'image_link' : form.image_link.data,
-      'genres' : form.genres.data,
       'facebook_link' : form.facebook_link.data,
       'website' : form.website.data,
       'seeking_venue' : form.seeking_venue.data,
       'seeking_description' : form.seeking_description.data
     }
     db.session.query(Artist).filter(Artist.id == artist_id).update(new_artist)
+    Artist.query.get(artist_id).genres = Genre.from_names(form.genres.data)
     db.session.commit()
+    # the artist's name and image appear on the pages of its venues too
+    page_cache.delete(page_cache.artist_keys(artist_id))
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   except:
     error = True
@@ -343,14 +307,15 @@ def edit_venue_submission(venue_id):
       'address': form.address.data,
       'phone' : form.phone.data,
       'image_link' : form.image_link.data,
-      'genres' : form.genres.data,
       'facebook_link' : form.facebook_link.data,
       'website' : form.website.data,
       'seeking_talent' : form.seeking_talent.data,
       'seeking_description' : form.seeking_description.data
     }
     db.session.query(Venue).filter(Venue.id == venue_id).update(new_venue)
+    Venue.query.get(venue_id).genres = Genre.from_names(form.genres.data)
     db.session.commit()
+    page_cache.delete(page_cache.venue_keys(venue_id))
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   except:
     error = True
@@ -380,7 +345,7 @@ def create_artist_submission():
       state = form.state.data,
       phone = form.phone.data,
       image_link = form.image_link.data,
-      genres = form.genres.data,
+      genres = Genre.from_names(form.genres.data),
       facebook_link = form.facebook_link.data,
       website = form.website.data,
       seeking_venue = form.seeking_venue.data,
@@ -404,21 +369,15 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-  # displays list of shows at /shows
-
-  data = []
-  shows_query = Show.query.all()
-  for show_query in shows_query:
-    show = {}
-    show['venue_id'] = show_query.venue_id
-    show['venue_name'] = Venue.query.get(show['venue_id']).name
-    show['artist_id'] = show_query.artist_id
-    show['artist_name'] = Artist.query.get(show['artist_id']).name
-    show['artist_image_link'] = Artist.query.get(show['artist_id']).image_link
-    show['start_time'] = str(show_query.start_time)
-    data.append(show)
-  
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, one keyset page at a time
+  after = request.args.get('after')
+  if after is not None:
+    try:
+      after = decode_show_cursor(after)
+    except ValueError:
+      abort(404)
+  data, next_cursor = show_page(after, app.config['SHOWS_PER_PAGE'])
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -438,6 +397,7 @@ def create_show_submission():
     )
     db.session.add(new_show)
     db.session.commit()
+    page_cache.delete(page_cache.show_keys(form.venue_id.data, form.artist_id.data))
     flash('Show was successfully listed!')
   except:
     error = True
@@ -448,6 +408,21 @@ def create_show_submission():
     db.session.close()
   return render_template('pages/home.html')
 
+#  Import
+#  ----------------------------------------------------------------
+
+@app.route('/<any(venues, artists, shows):kind>/import', methods=['POST'])
+def import_csv(kind):
+  # imports a CSV file, uploaded as the file field of a form or sent as the
+  # request body, see ingest.ingest() for the columns
+  if 'file' in request.files:
+    stream = request.files['file'].stream
+  else:
+    stream = request.stream
+  lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+  report = ingest(kind, lines, app.config['INGEST_CHUNK_SIZE'])
+  return jsonify(report.to_dict())
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -467,6 +442,35 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# Bulk import of venues, artists or shows from a CSV file:
+#   FLASK_APP=app.py flask import-csv venues venues.csv
+@app.cli.command('import-csv')
+@click.argument('kind', type=click.Choice(sorted(INGEST_KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=None, help='Rows inserted per transaction.')
+def import_csv_command(kind, path, chunk_size):
+  with open(path, encoding='utf-8-sig', newline='') as csv_file:
+    report = ingest(kind, csv_file, chunk_size or app.config['INGEST_CHUNK_SIZE'])
+  for error in report.errors:
+    click.echo('line {}: {}'.format(error['line'], error['error']), err=True)
+  click.echo('{} {} inserted, {} rows rejected in {:.1f} s ({:.0f} rows/s)'.format(
+    report.inserted, kind, report.error_count, report.seconds, report.rows_per_second))
+
+# Run periodically (e.g. every few minutes from cron) so that the show
+# counters of venues and artists follow the clock:
+#   FLASK_APP=app.py flask roll-over-show-counts
+@app.cli.command('roll-over-show-counts')
+@click.option('--recount', is_flag=True, help='Recompute every counter from the show table.')
+def roll_over_show_counts(recount):
+  if recount:
+    counters.recount()
+  else:
+    counters.roll_over()
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
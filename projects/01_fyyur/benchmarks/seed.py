@@ -0,0 +1,66 @@
+import random
+import datetime
+
+from models import db, Venue, Artist, Show, Genre, venue_genre, artist_genre
+from counters import recount
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+CITIES = [('City {}'.format(i), state) for i, state in enumerate(['CA', 'NY', 'TX', 'WA', 'IL'] * 10)]
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+  'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk',
+  'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+
+def insert_chunked(connection, table, rows, chunk_size=10000):
+  for start in range(0, len(rows), chunk_size):
+    connection.execute(table.insert(), rows[start:start + chunk_size])
+
+'''
+seed(venues, artists, shows, seed)
+    recreates the schema and fills it with synthetic venues, artists and
+    shows, the latter spread uniformly over two years around today
+    rows are inserted with executemany, bypassing the ORM, and the show
+    counters are computed once at the end
+'''
+def seed(venues=1000, artists=1000, shows=100000, seed=0):
+  rng = random.Random(seed)
+  db.session.remove()
+  db.drop_all()
+  db.create_all()
+
+  now = datetime.datetime.today()
+  with db.engine.begin() as connection:
+    insert_chunked(connection, Genre.__table__, [
+      {'id': i + 1, 'name': name} for i, name in enumerate(GENRES)
+    ])
+    insert_chunked(connection, Venue.__table__, [{
+      'id': i + 1,
+      'name': 'Venue {}'.format(i + 1),
+      'city': CITIES[i % len(CITIES)][0],
+      'state': CITIES[i % len(CITIES)][1],
+      'image_link': 'https://example.com/venues/{}.jpg'.format(i + 1)
+    } for i in range(venues)])
+    insert_chunked(connection, Artist.__table__, [{
+      'id': i + 1,
+      'name': 'Artist {}'.format(i + 1),
+      'city': CITIES[i % len(CITIES)][0],
+      'state': CITIES[i % len(CITIES)][1],
+      'image_link': 'https://example.com/artists/{}.jpg'.format(i + 1)
+    } for i in range(artists)])
+    insert_chunked(connection, venue_genre, [
+      {'venue_id': i + 1, 'genre_id': genre_id}
+      for i in range(venues) for genre_id in rng.sample(range(1, len(GENRES) + 1), 2)
+    ])
+    insert_chunked(connection, artist_genre, [
+      {'artist_id': i + 1, 'genre_id': genre_id}
+      for i in range(artists) for genre_id in rng.sample(range(1, len(GENRES) + 1), 2)
+    ])
+    insert_chunked(connection, Show.__table__, [{
+      'id': i + 1,
+      'venue_id': rng.randint(1, venues),
+      'artist_id': rng.randint(1, artists),
+      'start_time': now + datetime.timedelta(minutes=rng.randint(-525600, 525600))
+    } for i in range(shows)])
+  recount(now)
@@ -0,0 +1,112 @@
+'''
+Benchmark of the composite indexes of the show table
+
+Seeds a synthetic catalog, then requests every route that filters shows
+with and without the (venue_id, start_time), (artist_id, start_time) and
+(start_time, id) indexes, reporting timings and the query plans of the
+show statements
+The page cache is cleared before each request, so every one of them runs
+its statements
+
+  python benchmarks/show_indexes.py --shows 200000
+
+BENCH_DATABASE_URL selects the database (an in-memory SQLite by default)
+'''
+import os
+import sys
+import time
+import argparse
+import statistics
+from urllib.parse import quote
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db, Show
+from queries import encode_show_cursor
+from cache import page_cache
+from benchmarks.seed import seed
+
+SHOW_INDEXES = ['ix_show_venue_id_start_time', 'ix_show_artist_id_start_time', 'ix_show_start_time_id']
+
+def routes(args, middle):
+  return [
+    '/venues/{}'.format(args.venues // 2),
+    '/artists/{}'.format(args.artists // 2),
+    '/shows',
+    # a page from the middle of the history, reached by keyset
+    '/shows?after={}'.format(quote(middle)),
+  ]
+
+def middle_cursor(args):
+  show = Show.query.order_by(Show.start_time, Show.id).offset(args.shows // 2).first()
+  return encode_show_cursor(show.start_time, show.id)
+
+def explain(statement, parameters):
+  prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+  connection = db.engine.raw_connection()
+  try:
+    cursor = connection.cursor()
+    cursor.execute(prefix + statement, parameters)
+    return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+  finally:
+    connection.close()
+
+def measure(client, path, repeat):
+  statements = []
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements.append((statement, parameters))
+
+  timings = []
+  for i in range(repeat):
+    page_cache.clear()
+    if i == 0:
+      event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    start = time.perf_counter()
+    res = client.get(path)
+    timings.append((time.perf_counter() - start) * 1000)
+    if i == 0:
+      event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert res.status_code == 200, (path, res.status_code)
+  return timings, statements
+
+def report(phase, client, paths, args):
+  print('== {} =='.format(phase))
+  for path in paths:
+    timings, statements = measure(client, path, args.repeat)
+    print('{:<48} median {:8.2f} ms   max {:8.2f} ms   {} statements'.format(
+      path, statistics.median(timings), max(timings), len(statements)))
+    for statement, parameters in statements:
+      if ' show' not in statement.lower():
+        continue
+      for line in explain(statement, parameters):
+        print('    ' + line)
+  print()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=1000)
+  parser.add_argument('--shows', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+  app.config['TESTING'] = True
+  start = time.perf_counter()
+  seed(args.venues, args.artists, args.shows)
+  print('seeded {} shows in {:.1f} s\n'.format(args.shows, time.perf_counter() - start))
+
+  client = app.test_client()
+  paths = routes(args, middle_cursor(args))
+  indexes = [index for index in Show.__table__.indexes if index.name in SHOW_INDEXES]
+  for index in indexes:
+    index.drop(db.engine)
+  report('without show indexes', client, paths, args)
+  for index in indexes:
+    index.create(db.engine)
+  report('with show indexes', client, paths, args)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,156 @@
+import math
+import json
+import time
+import fnmatch
+import datetime
+import threading
+from collections import OrderedDict
+
+from models import Show, db
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+'''
+LRUCache(maxsize)
+    in-process cache with the subset of the redis-py client interface used
+    by PageCache (get, set with ex, delete, scan_iter), so that a Redis
+    client and this local stand-in are interchangeable
+    holds at most maxsize entries, evicting the least recently used
+'''
+class LRUCache(object):
+  def __init__(self, maxsize=1024, clock=time.monotonic):
+    self.maxsize = maxsize
+    self.clock = clock
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      value, expires_at = entry
+      if expires_at is not None and self.clock() >= expires_at:
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ex=None):
+    if isinstance(value, str):
+      value = value.encode('utf-8')
+    expires_at = self.clock() + ex if ex is not None else None
+    with self._lock:
+      self._entries[key] = (value, expires_at)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+    return True
+
+  def delete(self, *keys):
+    with self._lock:
+      return sum(1 for key in keys if self._entries.pop(key, None) is not None)
+
+  def scan_iter(self, match='*'):
+    with self._lock:
+      keys = list(self._entries)
+    return iter([key for key in keys if fnmatch.fnmatchcase(key, match)])
+
+'''
+create_backend(url, maxsize)
+    a Redis client for url (redis://...), which needs the redis package,
+    or an LRUCache when url is None
+'''
+def create_backend(url=None, maxsize=1024):
+  if url is None:
+    return LRUCache(maxsize)
+  try:
+    import redis
+  except ImportError:
+    raise RuntimeError('CACHE_URL is set but the redis package is not installed')
+  return redis.Redis.from_url(url)
+
+#----------------------------------------------------------------------------#
+# Detail page cache.
+#----------------------------------------------------------------------------#
+
+'''
+next_show_time(data)
+    start time of the first upcoming show of venue or artist page data,
+    after which the show moves to the past shows
+'''
+def next_show_time(data):
+  if not data['upcoming_shows']:
+    return None
+  return datetime.datetime.fromisoformat(data['upcoming_shows'][0]['start_time'])
+
+'''
+PageCache
+    read-through cache of the data of the venue and artist pages, stored
+    as JSON under '<prefix><kind>:<id>'
+    an entry lives ttl seconds at most, and no longer than the start of
+    the page's next upcoming show, so the past/upcoming split stays right
+    the routes that change a venue, an artist or a show delete the keys
+    of the pages showing them, see venue_keys() and artist_keys()
+'''
+class PageCache(object):
+  def __init__(self, backend=None, ttl=300, prefix='fyyur:'):
+    self.backend = backend or LRUCache()
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def init_app(self, app):
+    self.backend = create_backend(app.config.get('CACHE_URL'), app.config.get('CACHE_MAX_ENTRIES', 1024))
+    self.ttl = app.config.get('CACHE_TTL', 300)
+
+  def key(self, kind, entity_id):
+    return '{}{}:{}'.format(self.prefix, kind, entity_id)
+
+  '''
+  get_or_build(kind, entity_id, build)
+      returns the cached page data, or the data returned by build(),
+      which is cached unless it is None
+  '''
+  def get_or_build(self, kind, entity_id, build):
+    key = self.key(kind, entity_id)
+    cached = self.backend.get(key)
+    if cached is not None:
+      return json.loads(cached)
+    data = build()
+    if data is None:
+      return None
+    ttl = self.ttl
+    next_show = next_show_time(data)
+    if next_show is not None:
+      ttl = min(ttl, (next_show - datetime.datetime.today()).total_seconds())
+    if ttl > 0:
+      self.backend.set(key, json.dumps(data), ex=max(1, math.floor(ttl)))
+    return data
+
+  '''
+  venue_keys(venue_id) / artist_keys(artist_id)
+      keys of the pages showing the venue (its own and those of the
+      artists with shows there), or the artist
+      collect them before deleting rows, delete them after committing
+  '''
+  def venue_keys(self, venue_id):
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id==venue_id).distinct()
+    return [self.key('venue', venue_id)] + [self.key('artist', row[0]) for row in artist_ids]
+
+  def artist_keys(self, artist_id):
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id==artist_id).distinct()
+    return [self.key('artist', artist_id)] + [self.key('venue', row[0]) for row in venue_ids]
+
+  def show_keys(self, venue_id, artist_id):
+    return [self.key('venue', venue_id), self.key('artist', artist_id)]
+
+  def delete(self, keys):
+    if keys:
+      self.backend.delete(*keys)
+
+  def clear(self):
+    self.delete(list(self.backend.scan_iter(self.prefix + '*')))
+
+page_cache = PageCache()
@@ -0,0 +1,160 @@
+import time
+import hashlib
+from functools import wraps
+from datetime import timezone
+from flask import request, session, make_response
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Table versions.
+#----------------------------------------------------------------------------#
+
+'''
+TableVersions(db)
+    a change counter and last modification time per table, stored in the
+    table_version table so that every server process validates against the
+    same versions
+    a write bumps the versions of its tables in its own transaction: ORM
+    flushes and bulk query.update() / query.delete() once track() is
+    called, Core statements (show counters, CSV import) by calling bump()
+'''
+class TableVersions(object):
+  def __init__(self, db):
+    self.db = db
+    self.table = db.Table('table_version',
+      db.Column('name', db.String(64), primary_key=True),
+      db.Column('version', db.Integer, nullable=False),
+      db.Column('modified', db.Float, nullable=False)
+    )
+    event.listen(self.table, 'after_create', self.create_versions)
+
+  def create_versions(self, target, connection, **kw):
+    now = time.time()
+    connection.execute(self.table.insert(), [
+      {'name': name, 'version': 0, 'modified': now}
+      for name in self.db.metadata.tables if name != self.table.name
+    ])
+
+  '''
+  bump(connection, *tables)
+      increments the versions of tables (names) with the connection of the
+      transaction that writes them, one row at a time in name order
+      the version rows stay locked until that transaction ends, so writers
+      of the same table commit one after the other; bumping after the
+      commit would let them overlap, but a read between the commit and the
+      bump would cache the new rows under the old version
+  '''
+  def bump(self, connection, *tables):
+    now = time.time()
+    for name in sorted(set(tables)):
+      result = connection.execute(self.table.update()
+        .where(self.table.c.name==name)
+        .values(version=self.table.c.version + 1, modified=now))
+      if result.rowcount == 0:
+        connection.execute(self.table.insert().values(name=name, version=1, modified=now))
+
+  '''
+  deleted(table)
+      names of table and of the tables whose rows the database deletes or
+      updates with it through ON DELETE foreign keys
+  '''
+  def deleted(self, table):
+    names = {table.name}
+    for other in table.metadata.tables.values():
+      for foreign_key in other.foreign_keys:
+        if foreign_key.ondelete and foreign_key.references(table):
+          names.add(other.name)
+    return names
+
+  def versions(self, tables):
+    rows = self.db.session.execute(
+      select([self.table]).where(self.table.c.name.in_(tables))
+    ).fetchall()
+    found = {row.name: row for row in rows}
+    return [found.get(table) for table in tables]
+
+  '''
+  etag(versions, key)
+      strong validator of the tables at versions, for the resource named key
+  '''
+  def etag(self, versions, key):
+    state = '{}:{}'.format([row and (row.version, row.modified) for row in versions], key)
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()
+
+  def last_modified(self, versions):
+    if None in versions:
+      # never bumped nor created with the table: modified as far as we know
+      return int(time.time())
+    return int(max(row.modified for row in versions))
+
+  '''
+  track()
+      registers the ORM events that bump the versions
+  '''
+  def track(self):
+    def ours(tables):
+      return [table for table in tables if table.metadata is self.db.metadata]
+
+    def tables_of(instances):
+      return ours(inspect(instance).mapper.local_table for instance in instances)
+
+    def after_flush(session, flush_context):
+      # the session still lists what the flush wrote
+      written = tables_of(session.new) + tables_of(
+        instance for instance in session.dirty if session.is_modified(instance))
+      names = {table.name for table in written}
+      for table in tables_of(session.deleted):
+        names |= self.deleted(table)
+      if names:
+        self.bump(session.connection(), *names)
+
+    def after_bulk_update(context):
+      for table in ours([context.primary_table]):
+        self.bump(context.session.connection(), table.name)
+
+    def after_bulk_delete(context):
+      for table in ours([context.primary_table]):
+        self.bump(context.session.connection(), *self.deleted(table))
+
+    event.listen(Session, 'after_flush', after_flush)
+    event.listen(Session, 'after_bulk_update', after_bulk_update)
+    event.listen(Session, 'after_bulk_delete', after_bulk_delete)
+
+  '''
+  conditional(*tables)
+      decorates a GET view whose output depends only on tables (and on the
+      request url); adds ETag and Last-Modified headers to its responses
+      and answers If-None-Match / If-Modified-Since with an empty 304
+      after reading only the versions of tables
+  '''
+  def conditional(self, *tables):
+    def conditional_decorator(f):
+      @wraps(f)
+      def wrapper(*args, **kwargs):
+        if session.get('_flashes'):
+          return f(*args, **kwargs)
+        versions = self.versions(tables)
+        etag = self.etag(versions, request.full_path)
+        last_modified = self.last_modified(versions)
+        if request.if_none_match:
+          not_modified = request.if_none_match.contains(etag)
+        else:
+          since = request.if_modified_since
+          if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+          not_modified = since is not None and since.timestamp() >= last_modified
+
+        if not_modified:
+          response = make_response('', 304)
+        else:
+          response = make_response(f(*args, **kwargs))
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+      return wrapper
+    return conditional_decorator
+
+table_versions = TableVersions(db)
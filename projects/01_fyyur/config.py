@@ -9,6 +9,46 @@ DEBUG = True
 # Connect to the database
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://jaime@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+# DATABASE_URL points the app to another database, e.g. sqlite:////tmp/fyyur.db
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://jaime@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool of the database engine (not used with SQLite): connections
+# kept open, extra connections allowed under load, seconds to wait for a free
+# connection, seconds before a connection is replaced, and whether
+# connections are tested before use
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+# Log the SQL statements, their time and the pool state after each request
+DB_METRICS_LOG = False
+# Serve the pool state and totals as JSON at /_metrics/db
+DB_METRICS_ENDPOINT = False
+
+# Profile the SQL statements of every request, or only of the requests sent
+# with an X-Profile-SQL header when SQL_PROFILER_ALLOW_HEADER is set, and
+# flag the statements executed more than SQL_PROFILER_REPEAT_THRESHOLD times
+SQL_PROFILER = False
+SQL_PROFILER_ALLOW_HEADER = DEBUG
+SQL_PROFILER_REPEAT_THRESHOLD = 5
+
+# Number of shows listed per page at /shows
+SHOWS_PER_PAGE = 30
+
+# Search backend used by /venues/search and /artists/search: 'postgresql',
+# 'sqlite' or 'like'. None picks the one matching the database
+SEARCH_BACKEND = None
+# Maximum number of results returned by a search
+SEARCH_RESULTS_LIMIT = 50
+
+# Cache of the venue and artist pages: a Redis url (needs the redis package)
+# shared by the server processes, or None for an in-process LRU cache of
+# CACHE_MAX_ENTRIES pages; pages are kept CACHE_TTL seconds at most
+CACHE_URL = None
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 300
+
+# Rows inserted per transaction by CSV imports
+INGEST_CHUNK_SIZE = 500
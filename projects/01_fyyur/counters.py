@@ -0,0 +1,113 @@
+import datetime
+from sqlalchemy import and_, bindparam, case, event, select
+from sqlalchemy.sql import func
+
+from models import (
+  Venue,
+  Artist,
+  Show,
+  db
+)
+from conditional import table_versions
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count / past_shows_count and their Artist equivalents
+# count the shows that start after / before the row's shows_counted_at.
+# Inserting or deleting a show adjusts them, and roll_over() moves the shows
+# that started since shows_counted_at from upcoming to past.
+COUNTED = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+def _count_shows(model, foreign_key, *criteria):
+  return select([func.count(Show.id)]) \
+    .where(and_(foreign_key==model.id, *criteria)) \
+    .as_scalar()
+
+'''
+count_shows(connection, shows, delta)
+    adds delta to the counters of the venues and artists of shows, a list
+    of dicts with venue_id, artist_id and start_time, with one executemany
+    UPDATE per table
+'''
+def count_shows(connection, shows, delta):
+  for model, foreign_key in COUNTED:
+    upcoming = model.shows_counted_at <= bindparam('counted_start_time')
+    connection.execute(model.__table__.update()
+      .where(model.id==bindparam('counted_id'))
+      .values(
+        upcoming_shows_count=model.upcoming_shows_count + case([(upcoming, delta)], else_=0),
+        past_shows_count=model.past_shows_count + case([(upcoming, 0)], else_=delta)
+      ), [{
+        'counted_id': show[foreign_key.key],
+        'counted_start_time': show['start_time']
+      } for show in shows])
+
+def count_show(connection, show, delta):
+  count_shows(connection, [{
+    'venue_id': show.venue_id,
+    'artist_id': show.artist_id,
+    'start_time': show.start_time
+  }], delta)
+
+def after_show_insert(mapper, connection, show):
+  count_show(connection, show, 1)
+
+def after_show_delete(mapper, connection, show):
+  count_show(connection, show, -1)
+
+event.listen(Show, 'after_insert', after_show_insert)
+event.listen(Show, 'after_delete', after_show_delete)
+
+'''
+uncount_shows(criterion)
+    removes the shows matching criterion from the counters of their venues
+    and artists, for shows the database is about to delete by cascade
+'''
+def uncount_shows(criterion):
+  for model, foreign_key in COUNTED:
+    db.session.execute(model.__table__.update()
+      .where(model.id.in_(select([foreign_key]).where(criterion)))
+      .values(
+        upcoming_shows_count=model.upcoming_shows_count - _count_shows(
+          model, foreign_key, criterion, Show.start_time>=model.shows_counted_at),
+        past_shows_count=model.past_shows_count - _count_shows(
+          model, foreign_key, criterion, Show.start_time<model.shows_counted_at)
+      ))
+
+'''
+roll_over(now)
+    moves the shows that started between each row's shows_counted_at and
+    now from the upcoming to the past counters, one UPDATE per table
+    meant to run periodically, see the roll-over-show-counts command
+'''
+def roll_over(now=None):
+  now = now or datetime.datetime.today()
+  for model, foreign_key in COUNTED:
+    started = _count_shows(model, foreign_key,
+      Show.start_time>=model.shows_counted_at, Show.start_time<now)
+    db.session.execute(model.__table__.update()
+      .where(model.shows_counted_at<now)
+      .values(
+        upcoming_shows_count=model.upcoming_shows_count - started,
+        past_shows_count=model.past_shows_count + started,
+        shows_counted_at=now
+      ))
+  table_versions.bump(db.session.connection(), *(model.__tablename__ for model, _ in COUNTED))
+  db.session.commit()
+
+'''
+recount(now)
+    recomputes every counter from the show table
+'''
+def recount(now=None):
+  now = now or datetime.datetime.today()
+  for model, foreign_key in COUNTED:
+    db.session.execute(model.__table__.update().values(
+      upcoming_shows_count=_count_shows(model, foreign_key, Show.start_time>=now),
+      past_shows_count=_count_shows(model, foreign_key, Show.start_time<now),
+      shows_counted_at=now
+    ))
+  table_versions.bump(db.session.connection(), *(model.__tablename__ for model, _ in COUNTED))
+  db.session.commit()
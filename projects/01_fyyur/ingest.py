@@ -0,0 +1,258 @@
+import csv
+import time
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import (
+  Venue,
+  Artist,
+  Show,
+  Genre,
+  venue_genre,
+  artist_genre,
+  db
+)
+from forms import VenueForm, ArtistForm, ShowForm
+from counters import count_shows
+from cache import page_cache
+from conditional import table_versions
+
+#----------------------------------------------------------------------------#
+# CSV ingestion.
+#----------------------------------------------------------------------------#
+
+# Rejected rows listed in a report; the remaining ones are only counted
+MAX_REPORTED_ERRORS = 100
+# Separator of the genres within the genres column
+GENRE_SEPARATOR = ';'
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+
+VENUE_COLUMNS = ('name', 'city', 'state', 'address', 'phone', 'image_link',
+  'facebook_link', 'website', 'seeking_talent', 'seeking_description')
+ARTIST_COLUMNS = ('name', 'city', 'state', 'phone', 'image_link',
+  'facebook_link', 'website', 'seeking_venue', 'seeking_description')
+
+'''
+IngestReport
+    outcome of an ingestion: rows inserted, rows rejected (with the line
+    and reason of the first MAX_REPORTED_ERRORS), throughput, and the
+    tables written to
+'''
+class IngestReport(object):
+  def __init__(self, tables=()):
+    self.tables = tables
+    self.inserted = 0
+    self.errors = []
+    self.error_count = 0
+    self.seconds = 0
+    self._started = time.perf_counter()
+
+  def error(self, line, message):
+    self.error_count += 1
+    if len(self.errors) < MAX_REPORTED_ERRORS:
+      self.errors.append({'line': line, 'error': message})
+
+  def finish(self):
+    self.seconds = time.perf_counter() - self._started
+    # rows rejected at insertion are reported when their chunk is flushed,
+    # after later rows rejected by validation
+    self.errors.sort(key=lambda error: error['line'])
+
+  @property
+  def rows_per_second(self):
+    rows = self.inserted + self.error_count
+    return rows / self.seconds if self.seconds else 0
+
+  def to_dict(self):
+    return {
+      'inserted': self.inserted,
+      'errors': self.errors,
+      'total_errors': self.error_count,
+      'seconds': round(self.seconds, 3),
+      'rows_per_second': round(self.rows_per_second, 1)
+    }
+
+#  Validation
+#  ----------------------------------------------------------------
+
+def _formdata(row):
+  data = MultiDict()
+  for name, value in row.items():
+    # extra cells come under None, missing cells as None
+    if name is None or value is None:
+      continue
+    value = value.strip()
+    if name == 'genres':
+      for genre in value.split(GENRE_SEPARATOR):
+        if genre.strip():
+          data.add(name, genre.strip())
+    elif name in BOOLEAN_FIELDS:
+      data.add(name, 'y' if value.lower() in TRUE_VALUES else 'false')
+    else:
+      data.add(name, value)
+  return data
+
+'''
+validate_row(form, row)
+    validates a CSV row with the rules of form, as if its cells had been
+    posted to it, and returns the form holding the row's data
+    the same form instance is reused for every row, as binding the fields
+    of a new form costs more than validating them
+    raises ValueError with the first error found
+'''
+def validate_row(form, row):
+  form.process(_formdata(row))
+  if not form.validate():
+    field, messages = sorted(form.errors.items())[0]
+    raise ValueError('{}: {}'.format(field, messages[0]))
+  return form
+
+def _validate_venue(form, row):
+  form = validate_row(form, row)
+  return {column: getattr(form, column).data for column in VENUE_COLUMNS}, form.genres.data
+
+def _validate_artist(form, row):
+  form = validate_row(form, row)
+  return {column: getattr(form, column).data for column in ARTIST_COLUMNS}, form.genres.data
+
+def _validate_show(form, row):
+  # ShowForm would fall back to its default start_time
+  for column in ('artist', 'venue', 'start_time'):
+    if not (row.get(column) or '').strip():
+      raise ValueError('{}: This field is required.'.format(column))
+  form = validate_row(form, row)
+  return {
+    'artist': row['artist'].strip(),
+    'venue': row['venue'].strip(),
+    'start_time': form.start_time.data
+  }
+
+#  Insertion
+#  ----------------------------------------------------------------
+
+'''
+_name_map(model, names)
+    returns {name: id} for the rows of model named in names
+'''
+def _name_map(model, names):
+  if not names:
+    return {}
+  return dict(db.session.query(model.name, model.id).filter(model.name.in_(names)).all())
+
+def _genre_ids(names):
+  genre_ids = _name_map(Genre, names)
+  missing = [name for name in names if name not in genre_ids]
+  if missing:
+    db.session.execute(Genre.__table__.insert(), [{'name': name} for name in missing])
+    genre_ids = _name_map(Genre, names)
+  return genre_ids
+
+def _insert_entities(model, association, foreign_key, chunk):
+  taken = set(_name_map(model, [values['name'] for line, (values, genres) in chunk]))
+  rows = []
+  errors = []
+  for line, (values, genres) in chunk:
+    if values['name'] in taken:
+      errors.append((line, 'name: {} already exists'.format(values['name'])))
+      continue
+    taken.add(values['name'])
+    rows.append((values, genres))
+  if rows:
+    db.session.execute(model.__table__.insert(), [values for values, genres in rows])
+    ids = _name_map(model, [values['name'] for values, genres in rows])
+    genre_ids = _genre_ids({genre for values, genres in rows for genre in genres})
+    db.session.execute(association.insert(), [
+      {foreign_key: ids[values['name']], 'genre_id': genre_ids[genre]}
+      for values, genres in rows for genre in genres
+    ])
+  # new venues and artists have no cached page yet
+  return len(rows), errors, []
+
+def _insert_venues(chunk):
+  return _insert_entities(Venue, venue_genre, 'venue_id', chunk)
+
+def _insert_artists(chunk):
+  return _insert_entities(Artist, artist_genre, 'artist_id', chunk)
+
+def _insert_shows(chunk):
+  artist_ids = _name_map(Artist, {values['artist'] for line, values in chunk})
+  venue_ids = _name_map(Venue, {values['venue'] for line, values in chunk})
+  rows = []
+  errors = []
+  for line, values in chunk:
+    if values['artist'] not in artist_ids:
+      errors.append((line, 'artist: unknown artist {}'.format(values['artist'])))
+    elif values['venue'] not in venue_ids:
+      errors.append((line, 'venue: unknown venue {}'.format(values['venue'])))
+    else:
+      rows.append({
+        'artist_id': artist_ids[values['artist']],
+        'venue_id': venue_ids[values['venue']],
+        'start_time': values['start_time']
+      })
+  if rows:
+    db.session.execute(Show.__table__.insert(), rows)
+    # the rows bypass the ORM events that maintain the counters
+    count_shows(db.session, rows, 1)
+  cache_keys = {key for row in rows for key in page_cache.show_keys(row['venue_id'], row['artist_id'])}
+  return len(rows), errors, cache_keys
+
+# kind -> (form, validate, insert, tables written)
+KINDS = {
+  'venues': (VenueForm, _validate_venue, _insert_venues, ('venue', 'genre', 'venue_genre')),
+  'artists': (ArtistForm, _validate_artist, _insert_artists, ('artist', 'genre', 'artist_genre')),
+  'shows': (ShowForm, _validate_show, _insert_shows, ('show', 'venue', 'artist')),
+}
+
+def _flush(insert, chunk, report):
+  # a fresh app context per chunk, so that what Flask-SQLAlchemy keeps per
+  # context (every statement and its parameters in debug mode) does not
+  # grow with the file
+  try:
+    with current_app.app_context():
+      inserted, errors, cache_keys = insert(chunk)
+      # Core INSERTs skip the ORM events that bump the table versions
+      table_versions.bump(db.session.connection(), *report.tables)
+      db.session.commit()
+  except SQLAlchemyError as error:
+    db.session.rollback()
+    for line, values in chunk:
+      report.error(line, 'not inserted: {}'.format(error.__class__.__name__))
+    return
+  page_cache.delete(list(cache_keys))
+  report.inserted += inserted
+  for line, message in errors:
+    report.error(line, message)
+
+'''
+ingest(kind, lines, chunk_size)
+    reads venues, artists or shows (kind) from CSV lines, one row at a
+    time, and inserts the valid ones chunk_size rows per transaction with
+    executemany INSERTs
+    the first line names the columns: the fields of VenueForm/ArtistForm
+    (genres separated by GENRE_SEPARATOR), or artist, venue and start_time
+    for shows, artist and venue being names resolved once per chunk
+    memory use depends on chunk_size only, not on the number of rows
+    returns an IngestReport
+'''
+def ingest(kind, lines, chunk_size=500):
+  form_class, validate, insert, tables = KINDS[kind]
+  form = form_class(formdata=MultiDict(), meta={'csrf': False})
+  report = IngestReport(tables)
+  reader = csv.DictReader(lines)
+  chunk = []
+  for row in reader:
+    try:
+      chunk.append((reader.line_num, validate(form, row)))
+    except ValueError as error:
+      report.error(reader.line_num, str(error))
+      continue
+    if len(chunk) == chunk_size:
+      _flush(insert, chunk, report)
+      chunk = []
+  if chunk:
+    _flush(insert, chunk, report)
+  report.finish()
+  return report
@@ -0,0 +1,81 @@
+"""normalize venue and artist genres into a genre table
+
+Revision ID: b3e91d07c5a2
+Revises: 8c1f4e2a9b7d
+Create Date: 2026-10-18 11:40:05.517392
+
+"""
+import csv
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e91d07c5a2'
+down_revision = '8c1f4e2a9b7d'
+branch_labels = None
+depends_on = None
+
+
+def parse_genres(value):
+    # Genres were stored as the text of a PostgreSQL array: {Jazz,"Hip-Hop"}
+    if not value:
+        return []
+    names = next(csv.reader([value.strip().strip('{}')]))
+    return [name.strip() for name in names if name.strip()]
+
+
+def upgrade():
+    genre = op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    tables = {}
+    for owner in ('venue', 'artist'):
+        tables[owner] = op.create_table('{}_genre'.format(owner),
+        sa.Column('{}_id'.format(owner), sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['{}_id'.format(owner)], ['{}.id'.format(owner)], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('{}_id'.format(owner), 'genre_id')
+        )
+        op.create_index(op.f('ix_{}_genre_genre_id'.format(owner)), '{}_genre'.format(owner), ['genre_id'], unique=False)
+
+    # Move the stringified lists into the association tables
+    connection = op.get_bind()
+    genre_ids = {}
+    for owner in ('venue', 'artist'):
+        owner_table = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        pairs = set()
+        for owner_id, genres in connection.execute(sa.select([owner_table.c.id, owner_table.c.genres])):
+            for name in parse_genres(genres):
+                if name not in genre_ids:
+                    genre_ids[name] = connection.execute(genre.insert().values(name=name)).inserted_primary_key[0]
+                pairs.add((owner_id, genre_ids[name]))
+        if pairs:
+            op.bulk_insert(tables[owner], [
+                {'{}_id'.format(owner): owner_id, 'genre_id': genre_id} for owner_id, genre_id in sorted(pairs)
+            ])
+        op.drop_column(owner, 'genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    genre = sa.table('genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    for owner in ('venue', 'artist'):
+        op.add_column(owner, sa.Column('genres', sa.String(length=500), nullable=True))
+        owner_table = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        association = sa.table('{}_genre'.format(owner), sa.column('{}_id'.format(owner), sa.Integer), sa.column('genre_id', sa.Integer))
+        names = {}
+        query = sa.select([association.c['{}_id'.format(owner)], genre.c.name]) \
+            .select_from(association.join(genre, association.c.genre_id == genre.c.id)) \
+            .order_by(genre.c.name)
+        for owner_id, name in connection.execute(query):
+            names.setdefault(owner_id, []).append('"{}"'.format(name) if ',' in name or ' ' in name else name)
+        for owner_id, owner_names in names.items():
+            connection.execute(owner_table.update().where(owner_table.c.id == owner_id).values(genres='{' + ','.join(owner_names) + '}'))
+        op.drop_index(op.f('ix_{}_genre_genre_id'.format(owner)), table_name='{}_genre'.format(owner))
+        op.drop_table('{}_genre'.format(owner))
+    op.drop_table('genre')
@@ -1,13 +1,16 @@
+import datetime
 from flask import Flask
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.sql import func
+from search import register_search_index
+from pool import PooledSQLAlchemy
 
 # Create SQLAlchemy session connected with database
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = PooledSQLAlchemy(app)
 
 migrate = Migrate(app,db)
 
@@ -15,6 +18,40 @@ migrate = Migrate(app,db)
 # Models
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+  __tablename__ = 'genre'
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), nullable=False, unique=True)
+
+  '''
+  from_names(names)
+      returns the genres with the given names, adding the missing ones to
+      the session
+  '''
+  @classmethod
+  def from_names(cls, names):
+    names = list(dict.fromkeys(names or []))
+    existing = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names)).all()} if names else {}
+    genres = []
+    for name in names:
+      if name not in existing:
+        existing[name] = cls(name=name)
+        db.session.add(existing[name])
+      genres.append(existing[name])
+    return genres
+
+# Association tables: the primary key serves lookups by venue / artist,
+# the genre_id index serves the ?genre= filters
+venue_genre = db.Table('venue_genre',
+  db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+artist_genre = db.Table('artist_genre',
+  db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
 class Venue(db.Model):
   __tablename__ = 'venue'
   id = db.Column(db.Integer, primary_key=True)
@@ -24,11 +61,15 @@ class Venue(db.Model):
   address = db.Column(db.String(120))
   phone = db.Column(db.String(120))
   image_link = db.Column(db.String(500))
-  genres = db.Column(db.String(500))
+  genres = db.relationship(Genre, secondary=venue_genre, order_by=Genre.name)
   facebook_link = db.Column(db.String(120))
   seeking_talent = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(500))
   website = db.Column(db.String(500))
+  # Maintained by counters.py: shows starting before / after shows_counted_at
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  shows_counted_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.today, server_default=func.now())
 
 class Artist(db.Model):
   __tablename__ = 'artist'
@@ -37,15 +78,26 @@ class Artist(db.Model):
   city = db.Column(db.String(120), nullable=False)
   state = db.Column(db.String(120), nullable=False)
   phone = db.Column(db.String(120))
-  genres = db.Column(db.String(500))
+  genres = db.relationship(Genre, secondary=artist_genre, order_by=Genre.name)
   image_link = db.Column(db.String(500))
   facebook_link = db.Column(db.String(120))
   seeking_venue = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(500))
   website = db.Column(db.String(500))
+  # Maintained by counters.py: shows starting before / after shows_counted_at
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  shows_counted_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.today, server_default=func.now())
 
 class Show(db.Model):
   __tablename__ = 'show'
+  # Every page filters shows by venue or artist and by start_time, and
+  # /shows pages through them in (start_time, id) order
+  __table_args__ = (
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), nullable=False)
@@ -53,3 +105,5 @@ class Show(db.Model):
   venue = db.relationship(Venue,backref='shows')
   artist = db.relationship(Artist,backref='shows')
 
+register_search_index(Venue.__table__, 'name')
+register_search_index(Artist.__table__, 'name')
@@ -0,0 +1,193 @@
+import re
+import time
+import threading
+from flask import abort, g, has_app_context, jsonify, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+# Defaults of the DB_POOL_* settings
+POOL_DEFAULTS = {
+  'DB_POOL_SIZE': 5,
+  'DB_MAX_OVERFLOW': 10,
+  'DB_POOL_TIMEOUT': 30,
+  'DB_POOL_RECYCLE': 1800,
+  'DB_POOL_PRE_PING': True,
+}
+
+# Transaction control statements, such as the SAVEPOINTs of nested
+# transactions, which are not counted as queries: drivers like psycopg2
+# begin and commit transactions without executing a statement
+TRANSACTION_CONTROL = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+'''
+flag(value)
+    reads a boolean setting, which may come from an environment variable
+'''
+def flag(value):
+  if isinstance(value, str):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+  return bool(value)
+
+'''
+pool_options(config)
+    create_engine() options of the connection pool, from the DB_POOL_SIZE,
+    DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds to wait for a connection),
+    DB_POOL_RECYCLE (seconds before a connection is replaced) and
+    DB_POOL_PRE_PING (test connections on checkout) settings
+'''
+def pool_options(config):
+  settings = dict(POOL_DEFAULTS)
+  settings.update({key: config[key] for key in POOL_DEFAULTS if config.get(key) is not None})
+  return {
+    'poolclass': TimedQueuePool,
+    'pool_size': int(settings['DB_POOL_SIZE']),
+    'max_overflow': int(settings['DB_MAX_OVERFLOW']),
+    'pool_timeout': float(settings['DB_POOL_TIMEOUT']),
+    'pool_recycle': int(settings['DB_POOL_RECYCLE']),
+    'pool_pre_ping': flag(settings['DB_POOL_PRE_PING']),
+  }
+
+'''
+PooledSQLAlchemy
+    SQLAlchemy extension whose engine gets the pool_options() of the app
+    config, once the database url is known; SQLite keeps the pool chosen
+    by Flask-SQLAlchemy
+'''
+class PooledSQLAlchemy(SQLAlchemy):
+  def apply_driver_hacks(self, app, sa_url, options):
+    super().apply_driver_hacks(app, sa_url, options)
+    if sa_url.drivername != 'sqlite':
+      options.update(pool_options(app.config))
+
+'''
+TimedQueuePool
+    QueuePool recording in metrics how long each checkout waited for a
+    connection to be free
+'''
+class TimedQueuePool(QueuePool):
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      return super()._do_get()
+    finally:
+      metrics.record_wait(time.perf_counter() - start)
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+'''
+DatabaseMetrics
+    counts, through engine and pool events, the SQL statements executed
+    and their duration, connection checkouts and how long they waited,
+    per request (in flask.g) and since the process started
+'''
+class DatabaseMetrics(object):
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.totals = {
+      'statements': 0,
+      'statement_seconds': 0.0,
+      'checkouts': 0,
+      'checkins': 0,
+      'checkout_wait_seconds': 0.0,
+      'max_checkout_wait_seconds': 0.0,
+    }
+
+  def _add(self, name, value):
+    with self._lock:
+      self.totals[name] += value
+    if has_app_context():
+      setattr(g, '_db_' + name, getattr(g, '_db_' + name, 0) + value)
+
+  def record_wait(self, seconds):
+    self._add('checkout_wait_seconds', seconds)
+    with self._lock:
+      self.totals['max_checkout_wait_seconds'] = max(self.totals['max_checkout_wait_seconds'], seconds)
+
+  '''
+  track()
+      registers the engine and pool events, for every engine
+  '''
+  def track(self):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+      conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+      started = conn.info['metrics_started'].pop()
+      if not TRANSACTION_CONTROL.match(statement):
+        self._add('statements', 1)
+        self._add('statement_seconds', time.perf_counter() - started)
+
+    def handle_error(context):
+      if context.connection is not None and context.connection.info.get('metrics_started'):
+        context.connection.info['metrics_started'].pop()
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+      self._add('checkouts', 1)
+
+    def checkin(dbapi_connection, connection_record):
+      self._add('checkins', 1)
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', handle_error)
+    event.listen(Pool, 'checkout', checkout)
+    event.listen(Pool, 'checkin', checkin)
+
+  def request_stats(self):
+    return {name: getattr(g, '_db_' + name, 0) for name in ('statements', 'statement_seconds', 'checkout_wait_seconds')}
+
+  '''
+  pool_stats(engine)
+      connections checked out, idle in the pool, and beyond pool_size
+  '''
+  def pool_stats(self, engine):
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+      return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+      }
+    with self._lock:
+      return {'checked_out': self.totals['checkouts'] - self.totals['checkins']}
+
+  def snapshot(self, engine):
+    with self._lock:
+      totals = dict(self.totals)
+    return {'pool': self.pool_stats(engine), 'totals': totals}
+
+  '''
+  init_app(app, db)
+      logs the statements, their time and the pool state after each request
+      when DB_METRICS_LOG is set, and serves snapshot() as JSON at
+      /_metrics/db when DB_METRICS_ENDPOINT is set
+  '''
+  def init_app(self, app, db):
+    @app.after_request
+    def log_database_metrics(response):
+      if flag(app.config.get('DB_METRICS_LOG')):
+        stats = self.request_stats()
+        pool = self.pool_stats(db.engine)
+        app.logger.info('%s %s %s: %d statements in %.1f ms, %.1f ms waiting for a connection; pool: %s',
+          request.method, request.full_path, response.status_code, stats['statements'],
+          stats['statement_seconds'] * 1000, stats['checkout_wait_seconds'] * 1000,
+          ', '.join('{} {}'.format(value, name.replace('_', ' ')) for name, value in pool.items()))
+      return response
+
+    @app.route('/_metrics/db')
+    def database_metrics():
+      if not flag(app.config.get('DB_METRICS_ENDPOINT')):
+        abort(404)
+      return jsonify(self.snapshot(db.engine))
+
+metrics = DatabaseMetrics()
+metrics.track()
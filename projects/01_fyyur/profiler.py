@@ -0,0 +1,174 @@
+import re
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pool import TRANSACTION_CONTROL
+
+#----------------------------------------------------------------------------#
+# Statement profiles.
+#----------------------------------------------------------------------------#
+
+# IN lists of bound parameters, whose length depends on the parameters
+IN_LIST = re.compile(r'\(\s*(\?|%s|%\(\w+\)s)(\s*,\s*(\?|%s|%\(\w+\)s))*\s*\)')
+# Numbered bound parameter names, as in %(id_1)s
+NUMBERED_PARAMETER = re.compile(r'%\((\w+?)_\d+\)s')
+
+'''
+statement_shape(statement)
+    the statement with its variable-length IN lists and numbered parameter
+    names collapsed, so that statements differing only by their parameters
+    have the same shape
+'''
+def statement_shape(statement):
+  shape = NUMBERED_PARAMETER.sub(r'%(\1)s', statement)
+  return ' '.join(IN_LIST.sub('(...)', shape).split())
+
+'''
+Profile
+    the statements executed during a request or a block, with their
+    parameters and duration, grouped by shape on demand
+    transaction control statements are left out (see pool.py)
+'''
+class Profile(object):
+  def __init__(self):
+    self.statements = []
+
+  def record(self, statement, parameters, seconds):
+    self.statements.append((statement, parameters, seconds))
+
+  @property
+  def count(self):
+    return len(self.statements)
+
+  @property
+  def seconds(self):
+    return sum(seconds for statement, parameters, seconds in self.statements)
+
+  '''
+  shapes()
+      [(shape, executions, seconds)], most executed first
+  '''
+  def shapes(self):
+    groups = {}
+    for statement, parameters, seconds in self.statements:
+      shape = statement_shape(statement)
+      executions, total = groups.get(shape, (0, 0.0))
+      groups[shape] = (executions + 1, total + seconds)
+    return sorted(((shape, executions, total) for shape, (executions, total) in groups.items()),
+      key=lambda group: -group[1])
+
+  '''
+  repeated(threshold)
+      the shapes executed more than threshold times, the usual sign of a
+      query issued once per row of a previous one (N+1)
+  '''
+  def repeated(self, threshold):
+    return [group for group in self.shapes() if group[1] > threshold]
+
+  def report(self, threshold=None):
+    lines = ['{} statements in {:.1f} ms'.format(self.count, self.seconds * 1000)]
+    for shape, executions, seconds in self.shapes():
+      flag = ' N+1?' if threshold is not None and executions > threshold else ''
+      lines.append('  {:>4}x {:8.1f} ms{}  {}'.format(executions, seconds * 1000, flag, shape[:200]))
+    return '\n'.join(lines)
+
+def _listen(engine, profile):
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+  def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['profiler_started'].pop()
+    target = profile() if callable(profile) else profile
+    if target is not None and not TRANSACTION_CONTROL.match(statement):
+      target.record(statement, parameters, time.perf_counter() - started)
+
+  def handle_error(context):
+    if context.connection is not None and context.connection.info.get('profiler_started'):
+      context.connection.info['profiler_started'].pop()
+
+  listeners = [
+    ('before_cursor_execute', before_cursor_execute),
+    ('after_cursor_execute', after_cursor_execute),
+    ('handle_error', handle_error),
+  ]
+  for name, listener in listeners:
+    event.listen(engine, name, listener)
+  return listeners
+
+'''
+QueryRecorder(engine)
+    Profile of the statements executed on engine within a with block
+'''
+class QueryRecorder(Profile):
+  def __init__(self, engine):
+    super().__init__()
+    self.engine = engine
+
+  def __enter__(self):
+    self._listeners = _listen(self.engine, self)
+    return self
+
+  def __exit__(self, *exc_info):
+    for name, listener in self._listeners:
+      event.remove(self.engine, name, listener)
+
+'''
+query_budget(engine, max_statements, max_repeats)
+    fails the with block with an AssertionError listing its statements if
+    it executes more than max_statements, or any shape more than
+    max_repeats times
+'''
+@contextmanager
+def query_budget(engine, max_statements, max_repeats=None):
+  with QueryRecorder(engine) as recorder:
+    yield recorder
+  if recorder.count > max_statements:
+    raise AssertionError('query budget of {} exceeded: {}'.format(max_statements, recorder.report(max_repeats)))
+  if max_repeats is not None and recorder.repeated(max_repeats):
+    raise AssertionError('statement repeated more than {} times: {}'.format(max_repeats, recorder.report(max_repeats)))
+
+#----------------------------------------------------------------------------#
+# Request profiler.
+#----------------------------------------------------------------------------#
+
+'''
+QueryProfiler
+    profiles the statements of every request when SQL_PROFILER is set, or
+    of the requests carrying the X-Profile-SQL header when
+    SQL_PROFILER_ALLOW_HEADER is set
+    profiled responses get X-SQL-Queries, X-SQL-Time-Ms, X-SQL-Repeated
+    and Server-Timing headers; each shape executed more than
+    SQL_PROFILER_REPEAT_THRESHOLD times is logged as a warning and the
+    full report as debug
+'''
+class QueryProfiler(object):
+  HEADER = 'X-Profile-SQL'
+
+  def init_app(self, app):
+    _listen(Engine, lambda: g.get('_sql_profile') if has_app_context() else None)
+
+    @app.before_request
+    def start_sql_profile():
+      if app.config.get('SQL_PROFILER') or \
+          (app.config.get('SQL_PROFILER_ALLOW_HEADER') and request.headers.get(self.HEADER)):
+        g._sql_profile = Profile()
+
+    @app.after_request
+    def finish_sql_profile(response):
+      profile = g.pop('_sql_profile', None)
+      if profile is None:
+        return response
+      threshold = app.config.get('SQL_PROFILER_REPEAT_THRESHOLD', 5)
+      repeated = profile.repeated(threshold)
+      milliseconds = profile.seconds * 1000
+      response.headers['X-SQL-Queries'] = str(profile.count)
+      response.headers['X-SQL-Time-Ms'] = '{:.1f}'.format(milliseconds)
+      response.headers['X-SQL-Repeated'] = str(len(repeated))
+      response.headers.add('Server-Timing', 'sql;dur={:.1f};desc="{} queries"'.format(milliseconds, profile.count))
+      for shape, executions, seconds in repeated:
+        app.logger.warning('%s %s: statement executed %d times (%.1f ms): %s',
+          request.method, request.path, executions, seconds * 1000, shape[:200])
+      app.logger.debug('%s %s: %s', request.method, request.path, profile.report(threshold))
+      return response
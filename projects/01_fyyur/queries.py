@@ -0,0 +1,250 @@
+import datetime
+from itertools import groupby
+import dateutil.parser
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import func
+
+from models import (
+  Venue,
+  Artist,
+  Show,
+  Genre,
+  db
+)
+from repos import venue_repo, artist_repo
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+'''
+venue_areas(genre)
+    builds the area -> venue -> upcoming shows tree rendered at /venues
+    with a single statement, instead of one query per location and one
+    count per venue; the counts are read from Venue.upcoming_shows_count
+    when genre is given, only venues of that genre are listed
+'''
+def venue_areas(genre=None):
+  query = db.session.query(
+      Venue.city,
+      Venue.state,
+      Venue.id,
+      Venue.name,
+      Venue.upcoming_shows_count
+    )
+  if genre:
+    query = query.filter(Venue.genres.any(Genre.name==genre))
+  rows = query.order_by(Venue.state, Venue.city, Venue.name).all()
+
+  areas = []
+  for (city, state), location_rows in groupby(rows, key=lambda row: (row[0], row[1])):
+    areas.append({
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': row[2],
+        'name': row[3],
+        'num_upcoming_shows': row[4]
+      } for row in location_rows]
+    })
+  return areas
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+'''
+artist_list(genre)
+    returns the id and name of every artist rendered at /artists, or of
+    the artists of genre when it is given
+'''
+def artist_list(genre=None):
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = query.filter(Artist.genres.any(Genre.name==genre))
+  return [{'id': row[0], 'name': row[1]} for row in query.order_by(Artist.name).all()]
+
+#----------------------------------------------------------------------------#
+# Show timelines.
+#----------------------------------------------------------------------------#
+
+'''
+show_timeline(shows, format_show)
+    partitions shows, ordered by start time, into (past_shows,
+    upcoming_shows) in a single pass
+'''
+def show_timeline(shows, format_show):
+  now = datetime.datetime.today()
+  past_shows = []
+  upcoming_shows = []
+  for show in shows:
+    if show.start_time < now:
+      past_shows.append(format_show(show))
+    else:
+      upcoming_shows.append(format_show(show))
+  return past_shows, upcoming_shows
+
+'''
+venue_timeline(venue_id) / artist_timeline(artist_id)
+    the past and upcoming shows of a venue or artist, loaded in one query
+    with the artist or venue of each show
+'''
+def venue_timeline(venue_id):
+  return show_timeline(venue_repo.shows(venue_id), lambda show: {
+    'artist_id': show.artist_id,
+    'artist_name': show.artist.name,
+    'artist_image_link': show.artist.image_link,
+    'start_time': str(show.start_time)
+  })
+
+def artist_timeline(artist_id):
+  return show_timeline(artist_repo.shows(artist_id), lambda show: {
+    'venue_id': show.venue_id,
+    'venue_name': show.venue.name,
+    'venue_image_link': show.venue.image_link,
+    'start_time': str(show.start_time)
+  })
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+'''
+venue_page(venue_id) / artist_page(artist_id)
+    the data rendered by the venue or artist page, made of JSON types only
+    so it can be cached, or None when there is no such venue or artist
+'''
+def venue_page(venue_id):
+  venue_query = venue_repo.get(venue_id)
+  if venue_query is None:
+    return None
+  data = {}
+  data['id']=venue_query.id
+  data['name']=venue_query.name
+  data['genres']=[genre.name for genre in venue_query.genres]
+  data['address']=venue_query.address
+  data['city']=venue_query.city
+  data['state']=venue_query.state
+  data['phone']=venue_query.phone
+  data['website']=venue_query.website
+  data['facebook_link']=venue_query.facebook_link
+  data['seeking_talent']=venue_query.seeking_talent
+  data['seeking_description']=venue_query.seeking_description
+  data['image_link']=venue_query.image_link
+  data['past_shows'], data['upcoming_shows'] = venue_timeline(venue_id)
+  data['past_shows_count']=len(data['past_shows'])
+  data['upcoming_shows_count']=len(data['upcoming_shows'])
+  return data
+
+def artist_page(artist_id):
+  artist_query = artist_repo.get(artist_id)
+  if artist_query is None:
+    return None
+  data = {}
+  data['id']=artist_query.id
+  data['name']=artist_query.name
+  data['genres']=[genre.name for genre in artist_query.genres]
+  data['city']=artist_query.city
+  data['state']=artist_query.state
+  data['phone']=artist_query.phone
+  data['website']=artist_query.website
+  data['facebook_link']=artist_query.facebook_link
+  data['seeking_venue']=artist_query.seeking_venue
+  data['seeking_description']=artist_query.seeking_description
+  data['image_link']=artist_query.image_link
+  data['past_shows'], data['upcoming_shows'] = artist_timeline(artist_id)
+  data['past_shows_count']=len(data['past_shows'])
+  data['upcoming_shows_count']=len(data['upcoming_shows'])
+  return data
+
+#----------------------------------------------------------------------------#
+# Show counts.
+#----------------------------------------------------------------------------#
+
+'''
+upcoming_show_counts(foreign_key, ids)
+    counts the upcoming shows of many venues or artists with a single
+    GROUP BY statement, foreign_key being Show.venue_id or Show.artist_id
+    returns {id: count}, with 0 for the ids without upcoming shows
+'''
+def upcoming_show_counts(foreign_key, ids):
+  ids = list(ids)
+  counts = dict.fromkeys(ids, 0)
+  if not ids:
+    return counts
+  now = datetime.datetime.today()
+  rows = db.session.query(foreign_key, func.count(Show.id)) \
+    .filter(foreign_key.in_(ids), Show.start_time>=now) \
+    .group_by(foreign_key) \
+    .all()
+  counts.update(rows)
+  return counts
+
+#----------------------------------------------------------------------------#
+# Show listing.
+#----------------------------------------------------------------------------#
+
+'''
+encode_show_cursor(start_time, show_id) / decode_show_cursor(cursor)
+    converts the (start_time, id) keyset position of a show to and from
+    the opaque token passed in the ?after= query string
+    decode raises ValueError for malformed tokens, including ids outside
+    the range of the integer id column, which the database cannot bind
+'''
+SHOW_ID_RANGE = (-2**31, 2**31 - 1)
+
+def encode_show_cursor(start_time, show_id):
+  return '{}_{}'.format(start_time.isoformat(), show_id)
+
+def decode_show_cursor(cursor):
+  start_time, show_id = cursor.rsplit('_', 1)
+  show_id = int(show_id)
+  if not SHOW_ID_RANGE[0] <= show_id <= SHOW_ID_RANGE[1]:
+    raise ValueError('show id out of range: {}'.format(show_id))
+  try:
+    start_time = dateutil.parser.parse(start_time)
+  except OverflowError:
+    raise ValueError('start time out of range: {}'.format(start_time))
+  return start_time, show_id
+
+'''
+show_page(after, per_page)
+    returns one page of the /shows listing ordered by (start_time, id),
+    starting right after the keyset position after, together with the
+    cursor of the next page (None on the last page)
+    only the columns rendered by the template are selected, so the cost
+    of a page does not depend on how deep into the history it is
+'''
+def show_page(after=None, per_page=30):
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name,
+      Show.artist_id,
+      Artist.name,
+      Artist.image_link
+    ).join(Venue, Show.venue) \
+    .join(Artist, Show.artist)
+  if after is not None:
+    start_time, show_id = after
+    query = query.filter(or_(
+      Show.start_time>start_time,
+      and_(Show.start_time==start_time, Show.id>show_id)
+    ))
+  rows = query.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+
+  next_cursor = None
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    next_cursor = encode_show_cursor(rows[-1][1], rows[-1][0])
+
+  shows = [{
+    'venue_id': row[2],
+    'venue_name': row[3],
+    'artist_id': row[4],
+    'artist_name': row[5],
+    'artist_image_link': row[6],
+    'start_time': str(row[1])
+  } for row in rows]
+  return shows, next_cursor
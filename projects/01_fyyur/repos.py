@@ -0,0 +1,49 @@
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import joinedload
+
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Repositories.
+#----------------------------------------------------------------------------#
+
+# Baked queries of the venue and artist pages, see projects/benchmarks/README.md
+bakery = baked.bakery()
+
+'''
+VenueRepo / ArtistRepo
+    hot lookups of the venue and artist pages
+    get(id) returns the venue or artist with its genres loaded, or None;
+    like query.get(), it is answered from the session when already loaded
+    shows(id) returns its shows, the artist or venue of each joined in,
+    ordered by start time
+'''
+class VenueRepo(object):
+  _venue = bakery(lambda session: session.query(Venue).options(joinedload(Venue.genres)))
+  _shows = bakery(lambda session: session.query(Show)
+    .options(joinedload(Show.artist))
+    .filter(Show.venue_id == bindparam('venue_id'))
+    .order_by(Show.start_time))
+
+  def get(self, venue_id):
+    return self._venue(db.session()).get(venue_id)
+
+  def shows(self, venue_id):
+    return self._shows(db.session()).params(venue_id=venue_id).all()
+
+class ArtistRepo(object):
+  _artist = bakery(lambda session: session.query(Artist).options(joinedload(Artist.genres)))
+  _shows = bakery(lambda session: session.query(Show)
+    .options(joinedload(Show.venue))
+    .filter(Show.artist_id == bindparam('artist_id'))
+    .order_by(Show.start_time))
+
+  def get(self, artist_id):
+    return self._artist(db.session()).get(artist_id)
+
+  def shows(self, artist_id):
+    return self._shows(db.session()).params(artist_id=artist_id).all()
+
+venue_repo = VenueRepo()
+artist_repo = ArtistRepo()
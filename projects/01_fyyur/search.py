@@ -0,0 +1,127 @@
+from sqlalchemy import DDL, event, text
+from sqlalchemy.sql import func
+
+# Terms shorter than a trigram can not be answered by the search indexes
+MIN_INDEXED_TERM_LENGTH = 3
+
+#----------------------------------------------------------------------------#
+# Indexes.
+#----------------------------------------------------------------------------#
+
+def fts_table_name(table, column):
+  return '{}_{}_fts'.format(table.name, column)
+
+def trigram_index_name(table, column):
+  return 'ix_{}_{}_trgm'.format(table.name, column)
+
+'''
+register_search_index(table, column)
+    attaches the DDL of the search index of table.column to the table,
+    so that db.create_all() builds it together with the table
+    PostgreSQL: a pg_trgm GIN index, which serves ILIKE '%term%'
+    SQLite: an FTS5 trigram table kept in sync with triggers
+    existing PostgreSQL databases get the index from the Alembic migrations
+'''
+def register_search_index(table, column):
+  fts = fts_table_name(table, column)
+  names = {'table': table.name, 'column': column, 'fts': fts}
+  sqlite_create = [
+    "CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+      "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    "CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+      "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+    "CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+      "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+      "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+  ]
+  for statement in sqlite_create:
+    event.listen(table, 'after_create', DDL(statement.format(**names)).execute_if(dialect='sqlite'))
+  event.listen(table, 'before_drop', DDL('DROP TABLE IF EXISTS {fts}'.format(**names)).execute_if(dialect='sqlite'))
+
+  postgresql_create = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin ({column} gin_trgm_ops)'
+  ]
+  for statement in postgresql_create:
+    statement = statement.format(index=trigram_index_name(table, column), **names)
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+def escape_like(term):
+  return term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+'''
+LikeSearch
+    case-insensitive substring match with LOWER(column) LIKE '%term%'
+    works on any database but scans the whole table, results are ordered
+    by column
+'''
+class LikeSearch(object):
+  def __init__(self, model, column):
+    self.model = model
+    self.column = column
+
+  def search(self, term, limit=None):
+    query = self.model.query \
+      .filter(func.lower(self.column).contains(term.lower(), autoescape=True)) \
+      .order_by(self.column)
+    if limit is not None:
+      query = query.limit(limit)
+    return query.all()
+
+'''
+PostgresTrigramSearch
+    ILIKE '%term%' answered by the pg_trgm GIN index, results are ranked
+    by trigram similarity to the term
+'''
+class PostgresTrigramSearch(LikeSearch):
+  def search(self, term, limit=None):
+    if len(term) < MIN_INDEXED_TERM_LENGTH:
+      return super(PostgresTrigramSearch, self).search(term, limit)
+    query = self.model.query \
+      .filter(self.column.ilike('%' + escape_like(term) + '%', escape='/')) \
+      .order_by(func.similarity(self.column, term).desc(), self.column)
+    if limit is not None:
+      query = query.limit(limit)
+    return query.all()
+
+'''
+SqliteFtsSearch
+    substring match answered by the FTS5 trigram table, results are ranked
+    by bm25
+'''
+class SqliteFtsSearch(LikeSearch):
+  def search(self, term, limit=None):
+    if len(term) < MIN_INDEXED_TERM_LENGTH:
+      return super(SqliteFtsSearch, self).search(term, limit)
+    table = self.model.__table__.name
+    fts = fts_table_name(self.model.__table__, self.column.key)
+    statement = text(
+      'SELECT {table}.* FROM {table} JOIN {fts} ON {fts}.rowid = {table}.id '
+      'WHERE {fts} MATCH :term ORDER BY {fts}.rank LIMIT :limit'.format(table=table, fts=fts)
+    )
+    phrase = '"{}"'.format(term.replace('"', '""'))
+    return self.model.query.from_statement(statement) \
+      .params(term=phrase, limit=-1 if limit is None else limit) \
+      .all()
+
+BACKENDS = {
+  'like': LikeSearch,
+  'postgresql': PostgresTrigramSearch,
+  'sqlite': SqliteFtsSearch
+}
+
+'''
+search(model, column, term, limit, backend)
+    returns the model instances whose column contains term, best matches
+    first, using the backend named by backend or, by default, the one
+    matching the database dialect
+'''
+def search(model, column, term, limit=None, backend=None):
+  if backend is None:
+    backend = model.query.session.get_bind(model.__mapper__).dialect.name
+  return BACKENDS.get(backend, LikeSearch)(model, column).search(term, limit)
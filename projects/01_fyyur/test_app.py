@@ -0,0 +1,482 @@
+import io
+import unittest
+import datetime
+from contextlib import ExitStack
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+
+from app import app
+from models import db, Venue, Artist, Show, Genre
+from queries import venue_areas, show_page, decode_show_cursor, upcoming_show_counts
+from search import search
+from counters import roll_over, recount
+from pool import metrics, pool_options, TimedQueuePool
+from profiler import QueryRecorder, query_budget, statement_shape
+from cache import LRUCache, PageCache, page_cache
+from testing import TEST_DATABASE_URL, rolled_back
+from repos import bakery, venue_repo, artist_repo
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Seed the database once, in TEST_DATABASE_URL."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        now = datetime.datetime.today()
+        jazz, folk = Genre(name='Jazz'), Genre(name='Folk')
+        artist = Artist(name='Test Artist', city='San Francisco', state='CA', genres=[jazz])
+        db.session.add(artist)
+        for i in range(20):
+            venue = Venue(
+                name='Test Venue {}'.format(i),
+                city=['San Francisco', 'New York'][i % 2],
+                state=['CA', 'NY'][i % 2],
+                genres=[jazz, folk] if i % 4 == 0 else [jazz]
+            )
+            db.session.add(venue)
+            for days in (-2, -1, 1, 2, 3):
+                db.session.add(Show(
+                    venue=venue,
+                    artist=artist,
+                    start_time=now + datetime.timedelta(days=days)
+                ))
+        db.session.commit()
+        db.session.remove()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+
+    def setUp(self):
+        """Define test variables and run each test in a rolled back transaction."""
+        self.client = app.test_client
+        self.transaction = ExitStack()
+        self.transaction.enter_context(rolled_back())
+
+    def tearDown(self):
+        """Executed after each test"""
+        self.transaction.close()
+
+    def test_get_venues(self):
+        res = self.client().get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Test Venue 0', res.data)
+        self.assertIn(b'New York, NY', res.data)
+
+    def test_get_venues_not_modified(self):
+        res = self.client().get('/venues')
+        etag = res.headers['ETag']
+
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().get('/venues', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        # only the versions of venue and show are read
+        self.assertEqual(counter.count, 1)
+
+        db.session.add(Venue(name='New Venue', city='Boston', state='MA'))
+        db.session.commit()
+        res = self.client().get('/venues', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_get_venues_modified_by_core_update(self):
+        etag = self.client().get('/venues').headers['ETag']
+
+        recount()
+        res = self.client().get('/venues', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_get_venues_by_genre(self):
+        res = self.client().get('/venues?genre=Folk')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'fa-music'), 5)
+        self.assertIn(b'Test Venue 4<', res.data)
+        self.assertNotIn(b'Test Venue 1<', res.data)
+
+    def test_get_artists_by_genre(self):
+        res = self.client().get('/artists?genre=Jazz')
+        self.assertIn(b'Test Artist', res.data)
+
+        res = self.client().get('/artists?genre=Folk')
+        self.assertNotIn(b'Test Artist', res.data)
+
+    def test_show_venue_genres(self):
+        res = self.client().get('/venues/1')
+
+        self.assertIn(b'<span class="genre">Folk</span>', res.data)
+        self.assertIn(b'<span class="genre">Jazz</span>', res.data)
+
+    def test_venues_query_count_is_constant(self):
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        # the table versions of the ETag, then the venues
+        self.assertLessEqual(counter.count, 2)
+
+    def test_venue_areas_counts_upcoming_shows(self):
+        areas = venue_areas()
+
+        self.assertEqual(len(areas), 2)
+        for area in areas:
+            self.assertEqual(len(area['venues']), 10)
+            for venue in area['venues']:
+                self.assertEqual(venue['num_upcoming_shows'], 3)
+
+    def test_create_show_updates_counters(self):
+        start_time = datetime.datetime.today() + datetime.timedelta(days=5)
+        res = self.client().post('/shows/create', data={
+            'artist_id': 1,
+            'venue_id': 1,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Venue.query.get(1).upcoming_shows_count, 4)
+        self.assertEqual(Venue.query.get(1).past_shows_count, 2)
+        self.assertEqual(Artist.query.get(1).upcoming_shows_count, 61)
+
+    def test_delete_venue_updates_artist_counters(self):
+        res = self.client().delete('/venues/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Artist.query.get(1).upcoming_shows_count, 57)
+        self.assertEqual(Artist.query.get(1).past_shows_count, 38)
+
+    def test_roll_over_moves_started_shows_to_past(self):
+        roll_over(datetime.datetime.today() + datetime.timedelta(days=1, hours=12))
+
+        venue = Venue.query.get(1)
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (2, 3))
+        artist = Artist.query.get(1)
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (40, 60))
+
+        recount()
+        venue = Venue.query.get(1)
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (3, 2))
+
+    def test_show_venue_query_count_is_constant(self):
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().get('/venues/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'3 Upcoming Shows', res.data)
+        self.assertIn(b'2 Past Shows', res.data)
+        self.assertLessEqual(counter.count, 2)
+
+    def test_show_artist_query_count_is_constant(self):
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().get('/artists/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'60 Upcoming Shows', res.data)
+        self.assertIn(b'40 Past Shows', res.data)
+        self.assertLessEqual(counter.count, 2)
+
+    def test_show_pages_follow_keyset_cursor(self):
+        seen = []
+        after = None
+        while True:
+            with QueryRecorder(db.engine) as counter:
+                shows, next_cursor = show_page(after, per_page=7)
+            self.assertEqual(counter.count, 1)
+            seen.extend(show['start_time'] for show in shows)
+            if next_cursor is None:
+                break
+            after = decode_show_cursor(next_cursor)
+
+        self.assertEqual(len(seen), 100)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_get_shows_paginated(self):
+        per_page = app.config['SHOWS_PER_PAGE']
+        app.config['SHOWS_PER_PAGE'] = 30
+        try:
+            res = self.client().get('/shows')
+        finally:
+            app.config['SHOWS_PER_PAGE'] = per_page
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'tile-show'), 30)
+        self.assertIn(b'/shows?after=', res.data)
+
+    def test_404_get_shows_bad_cursor(self):
+        res = self.client().get('/shows?after=nonsense')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_404_get_shows_cursor_out_of_range(self):
+        for cursor in ('2020-01-01T00:00:00_99999999999999999999999',
+                       '2020-01-01T00:00:00_-2147483649',
+                       '99999999999999999999-01-01_1'):
+            res = self.client().get('/shows?after=' + cursor)
+
+            self.assertEqual(res.status_code, 404, cursor)
+
+    def test_import_venues_csv(self):
+        body = (
+            'name,city,state,address,genres,facebook_link,website,seeking_talent\n'
+            'Imported Hall,Austin,TX,1 Main St,Jazz;Blues,https://facebook.com/hall,https://hall.com,yes\n'
+            'Test Venue 0,Austin,TX,1 Main St,Jazz,https://facebook.com/v0,https://v0.com,no\n'
+            'Nowhere,Austin,ZZ,1 Main St,Jazz,https://facebook.com/n,https://n.com,no\n'
+        )
+        res = self.client().post('/venues/import', data={'file': (io.BytesIO(body.encode()), 'venues.csv')})
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual([error['line'] for error in data['errors']], [3, 4])
+        venue = Venue.query.filter_by(name='Imported Hall').one()
+        self.assertEqual([genre.name for genre in venue.genres], ['Blues', 'Jazz'])
+        self.assertTrue(venue.seeking_talent)
+
+    def test_import_shows_csv_updates_counters(self):
+        start_time = datetime.datetime.today() + datetime.timedelta(days=5)
+        body = 'artist,venue,start_time\n' + 'Test Artist,Test Venue 0,{}\nNobody,Test Venue 0,{}\n'.format(
+            start_time.strftime('%Y-%m-%d %H:%M:%S'), start_time.strftime('%Y-%m-%d %H:%M:%S'))
+        res = self.client().post('/shows/import', data=body, content_type='text/csv')
+        data = res.get_json()
+
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['errors'], [{'line': 3, 'error': 'artist: unknown artist Nobody'}])
+        self.assertEqual(Venue.query.get(1).upcoming_shows_count, 4)
+        self.assertEqual(Artist.query.get(1).upcoming_shows_count, 61)
+
+    def test_search_venues(self):
+        res = self.client().post('/venues/search', data={'search_term': 'venue 1'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Test Venue 1<', res.data)
+        self.assertIn(b'Test Venue 19<', res.data)
+        self.assertNotIn(b'Test Venue 2<', res.data)
+        self.assertIn(b'Number of search results for "venue 1": 11', res.data)
+
+    def test_search_venues_cut_short(self):
+        limit = app.config['SEARCH_RESULTS_LIMIT']
+        app.config['SEARCH_RESULTS_LIMIT'] = 5
+        try:
+            res = self.client().post('/venues/search', data={'search_term': 'venue'})
+        finally:
+            app.config['SEARCH_RESULTS_LIMIT'] = limit
+
+        self.assertEqual(res.data.count(b'fa-music'), 5)
+        self.assertIn(b'Showing the first 5 search results', res.data)
+
+    def test_search_venues_query_count_is_constant(self):
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().post('/venues/search', data={'search_term': 'venue'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data.count(b'fa-music'), 20)
+        self.assertLessEqual(counter.count, 2)
+
+    def test_upcoming_show_counts(self):
+        db.session.add(Venue(name='Empty Venue', city='Boston', state='MA'))
+        db.session.commit()
+
+        with QueryRecorder(db.engine) as counter:
+            counts = upcoming_show_counts(Show.venue_id, range(1, 22))
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(counts, {i: 3 if i <= 20 else 0 for i in range(1, 22)})
+        self.assertEqual(upcoming_show_counts(Show.artist_id, [1]), {1: 60})
+        self.assertEqual(upcoming_show_counts(Show.artist_id, []), {})
+
+    def test_search_backends_agree(self):
+        for term in ['Ven', 'venue 1', 'nue 1', '1', 'nothing']:
+            like = search(Venue, Venue.name, term, backend='like')
+            fts = search(Venue, Venue.name, term, backend='sqlite')
+            self.assertEqual(sorted(v.id for v in like), sorted(v.id for v in fts))
+        self.assertEqual(len(search(Venue, Venue.name, 'Ven', limit=5)), 5)
+
+    def test_search_index_follows_updates(self):
+        venue = Venue.query.get(1)
+        venue.name = 'Renamed Hall'
+        db.session.commit()
+
+        self.assertEqual([v.id for v in search(Venue, Venue.name, 'named hal')], [1])
+        self.assertNotIn(1, [v.id for v in search(Venue, Venue.name, 'Test Venue 0')])
+
+    def test_database_metrics_endpoint(self):
+        self.assertEqual(self.client().get('/_metrics/db').status_code, 404)
+
+        app.config['DB_METRICS_ENDPOINT'] = True
+        try:
+            self.client().get('/venues')
+            res = self.client().get('/_metrics/db')
+        finally:
+            app.config['DB_METRICS_ENDPOINT'] = False
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(data['totals']['statements'], 0)
+        self.assertIn('checked_out', data['pool'])
+
+    def test_request_stats_count_statements(self):
+        with app.test_request_context():
+            venue_areas()
+            stats = metrics.request_stats()
+
+        self.assertEqual(stats['statements'], 1)
+        self.assertGreater(stats['statement_seconds'], 0)
+
+    def test_pool_options(self):
+        options = pool_options({'DB_POOL_SIZE': 20, 'DB_POOL_PRE_PING': False})
+
+        self.assertEqual(options['pool_size'], 20)
+        self.assertEqual(options['max_overflow'], 10)
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertIs(options['poolclass'], TimedQueuePool)
+
+    def test_timed_queue_pool_records_checkout_wait(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1)
+        connection = engine.connect()
+        try:
+            with self.assertRaises(TimeoutError):
+                engine.connect()
+        finally:
+            connection.close()
+
+        self.assertGreaterEqual(metrics.totals['max_checkout_wait_seconds'], 0.1)
+        self.assertEqual(metrics.pool_stats(engine)['checked_out'], 0)
+
+    def test_profiled_request_headers(self):
+        res = self.client().get('/venues/1', headers={'X-Profile-SQL': '1'})
+
+        self.assertEqual(res.headers['X-SQL-Queries'], '2')
+        self.assertEqual(res.headers['X-SQL-Repeated'], '0')
+        self.assertIn('sql;dur=', res.headers['Server-Timing'])
+        self.assertNotIn('X-SQL-Queries', self.client().get('/venues/1').headers)
+
+    def test_repeated_statements_are_flagged(self):
+        with QueryRecorder(db.engine) as recorder:
+            for venue_id in range(1, 11):
+                Venue.query.filter_by(id=venue_id).first()
+            Venue.query.filter(Venue.id.in_([1, 2])).all()
+            Venue.query.filter(Venue.id.in_([1, 2, 3])).all()
+
+        repeated = recorder.repeated(5)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 10)
+        self.assertEqual(len(recorder.shapes()), 2)
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            statement_shape('SELECT * FROM venue WHERE id IN (%(id_1)s, %(id_2)s) AND name = %(name_1)s'),
+            'SELECT * FROM venue WHERE id IN (...) AND name = %(name)s')
+
+    def test_query_budget(self):
+        with query_budget(db.engine, 2, max_repeats=1):
+            self.client().get('/venues/1')
+        page_cache.clear()
+        with self.assertRaises(AssertionError):
+            with query_budget(db.engine, 1):
+                self.client().get('/venues/1')
+
+    def test_show_venue_is_cached(self):
+        self.client().get('/venues/1')
+        with QueryRecorder(db.engine) as counter:
+            res = self.client().get('/venues/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'3 Upcoming Shows', res.data)
+        self.assertEqual(counter.count, 0)
+
+    def test_edit_venue_invalidates_cached_pages(self):
+        self.client().get('/venues/1')
+        self.client().get('/artists/1')
+        res = self.client().post('/venues/1/edit', data={
+            'name': 'Renamed Venue',
+            'city': 'San Francisco',
+            'state': 'CA',
+            'address': '1 Main St',
+            'phone': '123-123-1234',
+            'genres': ['Jazz'],
+            'facebook_link': 'https://www.facebook.com/renamed'
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertIn(b'Renamed Venue', self.client().get('/venues/1').data)
+        self.assertIn(b'Renamed Venue', self.client().get('/artists/1').data)
+
+    def test_create_show_invalidates_cached_pages(self):
+        self.client().get('/venues/1')
+        self.client().get('/venues/2')
+        start_time = datetime.datetime.today() + datetime.timedelta(days=5)
+        self.client().post('/shows/create', data={
+            'artist_id': 1,
+            'venue_id': 1,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+        self.assertIn(b'4 Upcoming Shows', self.client().get('/venues/1').data)
+        self.assertIn(b'61 Upcoming Shows', self.client().get('/artists/1').data)
+        with QueryRecorder(db.engine) as counter:
+            self.client().get('/venues/2')
+        self.assertEqual(counter.count, 0)
+
+    def test_cached_page_expires_at_next_show(self):
+        backend = LRUCache()
+        cache = PageCache(backend, ttl=300)
+        next_show = datetime.datetime.today() + datetime.timedelta(seconds=90)
+        data = {'upcoming_shows': [{'start_time': str(next_show)}]}
+        cache.get_or_build('venue', 1, lambda: data)
+        value, expires_at = backend._entries['fyyur:venue:1']
+        self.assertLessEqual(expires_at - backend.clock(), 90)
+
+        cache.get_or_build('venue', 2, lambda: {'upcoming_shows': []})
+        value, expires_at = backend._entries['fyyur:venue:2']
+        self.assertGreater(expires_at - backend.clock(), 290)
+
+        started = datetime.datetime.today() - datetime.timedelta(seconds=1)
+        cache.get_or_build('venue', 3, lambda: {'upcoming_shows': [{'start_time': str(started)}]})
+        self.assertIsNone(backend.get('fyyur:venue:3'))
+
+    def test_lru_cache_evicts_and_expires(self):
+        now = [0]
+        cache = LRUCache(maxsize=2, clock=lambda: now[0])
+        cache.set('a', '1', ex=10)
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(sorted(cache.scan_iter('*')), ['a', 'c'])
+        now[0] = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.delete('c', 'missing'), 1)
+
+    def test_repos_match_orm_queries(self):
+        for _ in range(2):
+            venue = venue_repo.get(1)
+            shows = venue_repo.shows(1)
+            db.session.expunge_all()
+        self.assertEqual(sorted(genre.name for genre in venue.genres), ['Folk', 'Jazz'])
+        self.assertEqual([show.id for show in shows],
+            [show.id for show in Show.query.filter_by(venue_id=1).order_by(Show.start_time)])
+        self.assertEqual(len(artist_repo.shows(1)), 100)
+        self.assertEqual(artist_repo.get(1).name, 'Test Artist')
+        self.assertIsNone(venue_repo.get(1000))
+        self.assertTrue(bakery.cache)
+
+    def test_404_show_venue_not_found(self):
+        res = self.client().get('/venues/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+from contextlib import contextmanager
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, orm
+
+from models import db
+from cache import page_cache
+
+# Database of the tests: an in-memory SQLite database by default, so they
+# need no server, or e.g. sqlite:////tmp/fyyur_test.db for a temporary file
+# or postgres://localhost:5432/fyyur_test
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+
+'''
+SavepointSession
+    session of rolled_back(), working in a SAVEPOINT begun again whenever
+    the code under test commits or rolls back, and rolled back on close()
+    the trivia tests use the same class (projects/02_trivia_api/backend/
+    testing.py): change both together
+'''
+class SavepointSession(SignallingSession):
+  def __init__(self, db, **options):
+    super().__init__(db, **options)
+    self.closing = False
+    event.listen(self, 'after_transaction_end', self.restart_savepoint)
+    self.begin_nested()
+
+  def restart_savepoint(self, session, transaction):
+    if transaction.nested and not transaction._parent.nested and not self.closing:
+      self.expire_all()
+      self.begin_nested()
+
+  def close(self):
+    self.closing = True
+    try:
+      self.rollback()
+      super().close()
+    finally:
+      self.closing = False
+    self.begin_nested()
+
+'''
+rolled_back()
+    context manager running its block in a transaction rolled back on exit,
+    so each test starts from the seeded database without reloading it, and
+    from an empty page_cache, which would keep pages of rolled back rows
+    db.session is bound to a single connection, its sessions are
+    SavepointSessions so the routes can commit and roll back
+'''
+@contextmanager
+def rolled_back():
+  page_cache.clear()
+  connection = db.engine.connect()
+  isolation_level = None
+  if connection.dialect.name == 'sqlite':
+    # pysqlite begins transactions on its own and loses the SAVEPOINTs,
+    # let SQLAlchemy emit BEGIN instead
+    isolation_level = connection.connection.isolation_level
+    connection.connection.isolation_level = None
+    event.listen(connection, 'begin', lambda conn: conn.execute('BEGIN'))
+  transaction = connection.begin()
+  app_session = db.session
+  db.session = orm.scoped_session(
+    orm.sessionmaker(class_=SavepointSession, db=db, bind=connection, binds={}),
+    scopefunc=app_session.registry.scopefunc
+  )
+  try:
+    yield connection
+  finally:
+    db.session.remove()
+    db.session = app_session
+    transaction.rollback()
+    if isolation_level is not None:
+      connection.connection.isolation_level = isolation_level
+    connection.close()
+    page_cache.clear()
@@ -2,19 +2,83 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
-from sqlalchemy.sql import func
 
-from models import db, setup_db, Question, Category
-
-import random
+from models import db, setup_db, database_path, Question, Category
+from pool import log_database_metrics
+from .cache import CachedCount
+from .quiz import QuestionPool
+from . import quiz
+from .search import search
+from . import conditional as table_versions
+from .streaming import stream_json, stream_ndjson
+from .bulk import read_rows, import_questions
+from .repos import question_repo
 
+# Default and maximum page size of GET /questions
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+# Seconds after which the question ids of a quiz category are read again
+# even though no write through the app changed them
+QUESTION_POOL_TTL = 300
+# Search backend ('postgresql', 'sqlite' or 'like', None to match the
+# database) and maximum number of results of POST /questions/search
+SEARCH_BACKEND = None
+SEARCH_RESULTS_LIMIT = 50
+# Rows fetched from the database, and encoded, at a time by the endpoints
+# that stream their results
+STREAM_CHUNK_SIZE = 100
+# Rows inserted per INSERT statement by POST /questions/bulk
+BULK_BATCH_SIZE = 1000
+# Connection pool of the database engine: connections kept open, extra
+# connections allowed under load, seconds to wait for a free connection,
+# seconds before a connection is replaced, and whether connections are
+# tested before use
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+# Log the SQL statements, their time and the pool state after each request
+DB_METRICS_LOG = False
+
+# Change counters of the tables behind the GET endpoints, used for ETags
+table_versions.track()
+# and of the questions of each category, used by the quiz question pools
+quiz.track()
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  app.config.from_mapping(
+    QUESTIONS_PER_PAGE=QUESTIONS_PER_PAGE,
+    MAX_QUESTIONS_PER_PAGE=MAX_QUESTIONS_PER_PAGE,
+    QUESTION_POOL_TTL=QUESTION_POOL_TTL,
+    SEARCH_BACKEND=SEARCH_BACKEND,
+    SEARCH_RESULTS_LIMIT=SEARCH_RESULTS_LIMIT,
+    STREAM_CHUNK_SIZE=STREAM_CHUNK_SIZE,
+    BULK_BATCH_SIZE=BULK_BATCH_SIZE,
+    DB_POOL_SIZE=DB_POOL_SIZE,
+    DB_MAX_OVERFLOW=DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT=DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE=DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING=DB_POOL_PRE_PING,
+    DB_METRICS_LOG=DB_METRICS_LOG
+  )
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+  # test_config may point SQLALCHEMY_DATABASE_URI to another database
+  setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+  log_database_metrics(app, db)
+
+  question_count = CachedCount(lambda: Question.query.count(), 'questions')
+  question_pool = QuestionPool(app.config['QUESTION_POOL_TTL'])
+
+  # Drops the state cached from the database, when rows change without the
+  # app knowing, e.g. inserted without the ORM or rolled back by the tests
+  def clear_caches():
+    question_count.invalidate()
+    question_pool.clear()
+  app.extensions['clear_caches'] = clear_caches
   
   # Set up CORS. Allow '*' for origins
   cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -29,6 +93,7 @@ def create_app(test_config=None):
 
   # Get list of categories from database via GET
   @app.route('/categories', methods=['GET'])
+  @table_versions.conditional('categories')
   def get_categories():
     categories = [c.type for c in Category.query.all()]
     
@@ -40,22 +105,35 @@ def create_app(test_config=None):
       'categories':categories
     })
 
-  # Get paginated list of questions from database via GET (max 10 questions per page)
+  # Get paginated list of questions from database via GET
+  # Pages are selected with ?page=<n> (LIMIT/OFFSET) or, for deep pages, with
+  # ?after=<question id> (keyset), and sized with ?per_page=<n>
   @app.route('/questions', methods=['GET'])
+  @table_versions.conditional('questions', 'categories')
   def get_questions():
     page = request.args.get('page', 1, type=int)
-    start = (page - 1) * 10
-    end = start + 10
-    questions = [q.format() for q in Question.query.all()]
+    after = request.args.get('after', None, type=int)
+    per_page = request.args.get('per_page', app.config['QUESTIONS_PER_PAGE'], type=int)
+    per_page = min(per_page, app.config['MAX_QUESTIONS_PER_PAGE'])
+    if page < 1 or per_page < 1:
+      abort(422)
+
+    query = Question.query.order_by(Question.id)
+    if after is not None:
+      query = query.filter(Question.id > after)
+    else:
+      query = query.offset((page - 1) * per_page)
+    questions = [q.format() for q in query.limit(per_page).all()]
     categories = [c.type for c in Category.query.all()]
 
-    if (len(questions) == 0) or (len(questions)<start)or (len(categories) == 0):
+    if (len(questions) == 0) or (len(categories) == 0):
       abort(404)
 
     return jsonify({
       'success':True,
-      'questions':questions[start:end],
-      'total_questions':len(questions),
+      'questions':questions,
+      'total_questions':question_count(),
+      'next_after':questions[-1]['id'] if len(questions) == per_page else None,
       'categories':categories
     })
 
@@ -98,7 +176,36 @@ def create_app(test_config=None):
       abort(422)
     
 
+  # Import many questions at once via POST, as a JSON array or as NDJSON
+  # (Content-Type: application/x-ndjson, one question per line)
+  # Invalid questions are skipped and reported, the valid ones are inserted
+  # in batches within a single transaction
+  @app.route('/questions/bulk', methods=['POST'])
+  def bulk_create_questions():
+    try:
+      inserted, errors, error_count = import_questions(read_rows(request), app.config['BULK_BATCH_SIZE'])
+      db.session.commit()
+    except:
+      db.session.rollback()
+      abort(422)
+    finally:
+      db.session.close()
+    return jsonify({
+      'success':True,
+      'inserted':inserted,
+      'errors':errors,
+      'total_errors':error_count
+    })
+
+  # Export every question as NDJSON, in the format accepted by /questions/bulk
+  @app.route('/questions/export', methods=['GET'])
+  def export_questions():
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+    query = Question.query.order_by(Question.id).yield_per(chunk_size)
+    return stream_ndjson((q.format() for q in query), chunk_size)
+
   # Search questions which contain search term as substring, case-insensitive, via POST
+  # Best matches come first, using the search index of the database when there is one
   @app.route('/questions/search', methods=['POST'])
   def search_question():
     # Check that submitted values are correct
@@ -106,7 +213,7 @@ def create_app(test_config=None):
       search_term = request.get_json()['searchTerm']
     except:
       abort(422)
-    question_matches_query = Question.query.filter(func.lower(Question.question).contains(search_term.lower())).all()
+    question_matches_query = search(search_term, app.config['SEARCH_RESULTS_LIMIT'], app.config['SEARCH_BACKEND'])
     questions = [q.format() for q in question_matches_query]
 
     return jsonify({
@@ -116,19 +223,26 @@ def create_app(test_config=None):
     })
 
   # List questions for a given category via GET
+  # The questions are streamed from a server-side cursor, so large categories
+  # are never held in memory at once
   @app.route('/categories/<int:category_id>/questions', methods=['GET'])
   def get_questions_by_category(category_id):
     #Sum 1 to category id due to bug in front-end which causes category id's to start from 0 instead of 1
     category_id = int(category_id)+1
-    questions_c = [q.format() for q in Question.query.filter_by(category=category_id).all()]
-    #Substract 1 from category id returned, so category icons are rendered correctly
-    for question in questions_c:
-      question['category'] = question['category']-1
-    return jsonify({
-      'success':True,
-      'questions':questions_c,
-      'total_questions':len(questions_c),
-    })
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+    query = question_repo.by_category(category_id, chunk_size)
+
+    def questions_c():
+      for q in query:
+        question = q.format()
+        #Substract 1 from category id returned, so category icons are rendered correctly
+        question['category'] = question['category']-1
+        yield question
+
+    return stream_json('questions', questions_c(),
+      head={'success':True},
+      tail=lambda count: {'total_questions':count},
+      chunk_size=chunk_size)
 
   # Quizz question randomizer which receives previous questions and a given category via POST, and return random new question
   @app.route('/quizzes', methods=['POST'])
@@ -146,19 +260,25 @@ def create_app(test_config=None):
 
     # If quiz_category type = click take all categories
     if quiz_category['type'] == 'click':
-      questions_c = [q.format() for q in Question.query.all()]
+      category = None
     else:
-      quiz_category['id'] = int(quiz_category['id'])+1
-      questions_c = [q.format() for q in Question.query.filter_by(category=quiz_category['id']).all()]
-    
-    if len(questions_c) == 0:
-      abort(404)
+      category = int(quiz_category['id'])+1
 
-    # Take only questions which are not in the list of previous questions
-    new_questions = list(filter(lambda x: x['id'] not in previous_questions, questions_c))
-    
-    # Take a random question from the list of new un-asked questions
-    next_question = random.choice(new_questions)
+    # Draw a random id among the questions which are not in the list of previous
+    # questions, and load only that question. None means every question was asked
+    next_question = None
+    try:
+      question_id = question_pool.pick(category, previous_questions)
+      while question_id is not None:
+        question = question_repo.get(question_id)
+        if question is not None:
+          next_question = question.format()
+          break
+        # The question was deleted by another worker since the pool was loaded
+        question_pool.remove(question_id)
+        question_id = question_pool.pick(category, previous_questions)
+    except LookupError:
+      abort(404)
 
     return jsonify({
       'question':next_question
@@ -0,0 +1,93 @@
+import json
+
+from models import db, Question, Category
+from .conditional import bump
+from .quiz import versioned_name
+
+# Validation errors reported in a bulk import response; the remaining ones
+# are only counted
+MAX_REPORTED_ERRORS = 100
+
+'''
+read_rows(request)
+    yields (index, row) for every question of a bulk import, read from an
+    NDJSON body (application/x-ndjson, one object per line, parsed as it
+    is received) or from a JSON array
+    a line that is not valid JSON is yielded as (index, None)
+    raises ValueError if a JSON body is not an array
+'''
+def read_rows(request):
+  if request.mimetype == 'application/x-ndjson':
+    index = 0
+    for line in request.stream:
+      if not line.strip():
+        continue
+      try:
+        yield index, json.loads(line)
+      except ValueError:
+        yield index, None
+      index += 1
+  else:
+    rows = request.get_json()
+    if not isinstance(rows, list):
+      raise ValueError('expected a JSON array of questions')
+    for index, row in enumerate(rows):
+      yield index, row
+
+'''
+validate_question(row, category_ids)
+    returns the column values of the question described by row, or raises
+    ValueError describing the first invalid field
+'''
+def validate_question(row, category_ids):
+  if not isinstance(row, dict):
+    raise ValueError('not a JSON object')
+  values = {}
+  for field in ('question', 'answer'):
+    if not isinstance(row.get(field), str) or not row[field].strip():
+      raise ValueError('{} must be a non-empty string'.format(field))
+    values[field] = row[field]
+  for field in ('difficulty', 'category'):
+    try:
+      values[field] = int(row.get(field))
+    except (TypeError, ValueError):
+      raise ValueError('{} must be an integer'.format(field))
+  if values['category'] not in category_ids:
+    raise ValueError('unknown category {}'.format(values['category']))
+  return values
+
+'''
+import_questions(rows, batch_size)
+    inserts the valid questions of rows, batch_size at a time with one
+    executemany INSERT per batch, in a single transaction
+    returns (inserted, errors, error_count), errors listing the index and
+    reason of the first MAX_REPORTED_ERRORS invalid rows
+    the rows are inserted without the ORM, so it bumps the versions of the
+    questions and of their categories itself; the caller commits
+'''
+def import_questions(rows, batch_size=1000):
+  category_ids = {row[0] for row in db.session.query(Category.id).all()}
+  inserted = 0
+  errors = []
+  error_count = 0
+  batch = []
+  categories = set()
+  for index, row in rows:
+    try:
+      batch.append(validate_question(row, category_ids))
+    except ValueError as error:
+      error_count += 1
+      if len(errors) < MAX_REPORTED_ERRORS:
+        errors.append({'index': index, 'error': str(error)})
+      continue
+    categories.add(batch[-1]['category'])
+    if len(batch) == batch_size:
+      db.session.execute(Question.__table__.insert(), batch)
+      inserted += len(batch)
+      batch = []
+  if batch:
+    db.session.execute(Question.__table__.insert(), batch)
+    inserted += len(batch)
+  if inserted:
+    bump(db.session.connection(), versioned_name(None), *[versioned_name(c) for c in categories])
+  return inserted, errors, error_count
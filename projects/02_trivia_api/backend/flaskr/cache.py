@@ -0,0 +1,32 @@
+import threading
+
+from . import conditional as table_versions
+
+'''
+CachedCount(count, table)
+    memoizes the result of an expensive COUNT(*) query together with the
+    version of table it was counted at, so list endpoints do not scan the
+    whole table on every request; it counts again once the table changed
+    in any server process
+'''
+class CachedCount(object):
+  def __init__(self, count, table):
+    self.count = count
+    self.table = table
+    self._lock = threading.Lock()
+    self._counted = None
+
+  def __call__(self):
+    version = table_versions.version(self.table)
+    with self._lock:
+      counted = self._counted
+    if counted is not None and version is not None and counted[0] == version:
+      return counted[1]
+    counted = (version, self.count())
+    with self._lock:
+      self._counted = counted
+    return counted[1]
+
+  def invalidate(self):
+    with self._lock:
+      self._counted = None
@@ -0,0 +1,96 @@
+import time
+import hashlib
+from functools import wraps
+from datetime import timezone
+from flask import g, request, make_response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, TableVersion
+
+'''
+bump(connection, *names)
+    increments the TableVersion rows of names (tables, or parts of one such
+    as the questions of a category), creating the ones missing, with the
+    connection of the transaction that writes them so the new versions
+    commit with the rows
+    the rows stay locked until that transaction ends, so the writers of
+    questions commit one after the other; bumping after the commit would
+    let them overlap, but a read in between would cache the new questions
+    under the old version
+    Core writes (bulk imports) call it, ORM writes go through track()
+'''
+def bump(connection, *names):
+  # INSERT .. ON CONFLICT is understood by PostgreSQL and SQLite >= 3.24
+  connection.execute(db.text(
+    'INSERT INTO table_versions (name, version, modified) VALUES (:name, 1, :modified) '
+    'ON CONFLICT (name) DO UPDATE SET version = table_versions.version + 1, modified = excluded.modified'
+  ), [{'name': name, 'modified': time.time()} for name in sorted(set(names))])
+
+'''
+track()
+    bumps the tables written by each ORM flush, and by bulk query.update()
+    and query.delete()
+'''
+def track():
+  def after_flush(session, flush_context):
+    changed = list(session.new) + list(session.deleted) + [
+      instance for instance in session.dirty if session.is_modified(instance)
+    ]
+    tables = {inspect(instance).mapper.local_table.name for instance in changed}
+    if tables:
+      bump(session.connection(), *tables)
+
+  def after_bulk_write(context):
+    bump(context.session.connection(), context.primary_table.name)
+
+  event.listen(Session, 'after_flush', after_flush)
+  event.listen(Session, 'after_bulk_update', after_bulk_write)
+  event.listen(Session, 'after_bulk_delete', after_bulk_write)
+
+'''
+version(name)
+    returns the version of table name, read from the database once per
+    request, so the caches keyed on it agree with the ETag of the request
+'''
+def version(name):
+  versions = g.setdefault('table_versions', {})
+  if name not in versions:
+    row = db.session.query(TableVersion.version).filter(TableVersion.name == name).first()
+    versions[name] = None if row is None else row[0]
+  return versions[name]
+
+'''
+conditional(*tables)
+    decorates a GET view whose output depends only on tables (and on the
+    request url); reads their TableVersion rows, the same for every server
+    process, to send ETag and Last-Modified headers and answer
+    If-None-Match / If-Modified-Since with an empty 304 without running
+    the view
+'''
+def conditional(*tables):
+  def conditional_decorator(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+      versions = TableVersion.query.filter(TableVersion.name.in_(tables)).order_by(TableVersion.name).all()
+      g.setdefault('table_versions', {}).update((v.name, v.version) for v in versions)
+      state = '{}:{}'.format([(v.name, v.version, v.modified) for v in versions], request.full_path)
+      etag = hashlib.sha1(state.encode('utf-8')).hexdigest()
+      last_modified = int(max(v.modified for v in versions)) if len(versions) == len(tables) else int(time.time())
+      if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+      else:
+        since = request.if_modified_since
+        if since is not None and since.tzinfo is None:
+          since = since.replace(tzinfo=timezone.utc)
+        not_modified = since is not None and since.timestamp() >= last_modified
+
+      if not_modified:
+        response = make_response('', 304)
+      else:
+        response = make_response(f(*args, **kwargs))
+      response.set_etag(etag)
+      response.last_modified = last_modified
+      return response
+    return wrapper
+  return conditional_decorator
@@ -0,0 +1,120 @@
+import time
+import random
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Question
+from . import conditional as table_versions
+
+# Number of random draws tried before falling back to filtering the pool
+MAX_REJECTIONS = 16
+
+'''
+versioned_name(category)
+    name of the TableVersion row counting the writes to the questions of
+    category; None, every category, is counted by the questions row
+'''
+def versioned_name(category):
+  if category is None:
+    return Question.__tablename__
+  return '{}/{}'.format(Question.__tablename__, category)
+
+'''
+track()
+    bumps the rows of the categories of the questions written by each ORM
+    flush, next to the questions row bumped by conditional.track()
+    questions deleted with query.delete() are left in the pools of their
+    category, and dropped by remove() once a quiz draws them
+'''
+def track():
+  def after_flush(session, flush_context):
+    categories = set()
+    for instance in list(session.new) + list(session.deleted) + list(session.dirty):
+      if isinstance(instance, Question) and (instance not in session.dirty or session.is_modified(instance)):
+        categories.update(c for c in inspect(instance).attrs.category.history.sum() if c is not None)
+    if categories:
+      table_versions.bump(session.connection(), *[versioned_name(c) for c in categories])
+
+  event.listen(Session, 'after_flush', after_flush)
+
+'''
+CategoryPool
+    question ids of a category, in an array to draw from and by position
+    to remove one in O(1), with the version they were read at
+'''
+class CategoryPool(object):
+  def __init__(self, ids, version):
+    self.ids = ids
+    self.positions = {question_id: i for i, question_id in enumerate(ids)}
+    self.version = version
+    self.loaded_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def remove(self, question_id):
+    with self.lock:
+      position = self.positions.pop(question_id, None)
+      if position is None:
+        return
+      # Swap with the last id so removal stays O(1)
+      last_id = self.ids.pop()
+      if last_id != question_id:
+        self.ids[position] = last_id
+        self.positions[last_id] = position
+
+'''
+QuestionPool(ttl)
+    keeps a CategoryPool per category so a quiz can draw a random unseen
+    question without loading the whole category; the key None holds every
+    question, for quizzes over all categories
+    a category is read again (only the ids) once its version changed, i.e.
+    its questions were written by any server process, or after ttl seconds
+    for the changes made outside the app; it is read without holding any
+    lock and then swapped in, so other categories are never kept waiting
+'''
+class QuestionPool(object):
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._pools = {}
+
+  def _pool(self, category):
+    version = table_versions.version(versioned_name(category))
+    pool = self._pools.get(category)
+    if pool is None or pool.version != version or time.monotonic() - pool.loaded_at >= self.ttl:
+      query = db.session.query(Question.id)
+      if category is not None:
+        query = query.filter(Question.category == category)
+      pool = CategoryPool([row[0] for row in query.all()], version)
+      self._pools[category] = pool
+    return pool
+
+  '''
+  pick(category, previous_questions)
+      returns the id of a random question of category whose id is not in
+      previous_questions, or None once every question has been asked
+      raises LookupError if the category has no questions at all
+  '''
+  def pick(self, category, previous_questions):
+    pool = self._pool(category)
+    with pool.lock:
+      if len(pool.ids) == 0:
+        raise LookupError(category)
+
+      asked = set(previous_questions)
+      # Rejection sampling: constant time while most questions are unseen
+      for _ in range(MAX_REJECTIONS):
+        question_id = random.choice(pool.ids)
+        if question_id not in asked:
+          return question_id
+
+      unseen = [question_id for question_id in pool.ids if question_id not in asked]
+      if len(unseen) == 0:
+        return None
+      return random.choice(unseen)
+
+  def remove(self, question_id):
+    for pool in list(self._pools.values()):
+      pool.remove(question_id)
+
+  def clear(self):
+    self._pools = {}
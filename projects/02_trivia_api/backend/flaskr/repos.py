@@ -0,0 +1,30 @@
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+
+from models import db, Question
+
+# Baked queries of the question endpoints, see projects/benchmarks/README.md
+bakery = baked.bakery()
+
+'''
+QuestionRepo
+    hot lookups of the question endpoints
+    by_category(category, chunk_size) returns the questions of category
+    ordered by id, fetched chunk_size rows at a time as they are iterated
+    get(question_id) returns the question or None, from the session when
+    it is already loaded
+'''
+class QuestionRepo(object):
+  _question = bakery(lambda session: session.query(Question))
+  _by_category = bakery(lambda session: session.query(Question)
+    .filter(Question.category == bindparam('category'))
+    .order_by(Question.id))
+
+  def by_category(self, category, chunk_size):
+    query = self._by_category.with_criteria(lambda q: q.yield_per(chunk_size), chunk_size)
+    return query(db.session()).params(category=category)
+
+  def get(self, question_id):
+    return self._question(db.session()).get(question_id)
+
+question_repo = QuestionRepo()
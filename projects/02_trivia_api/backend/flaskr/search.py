@@ -0,0 +1,81 @@
+from sqlalchemy import DDL, event, text
+from sqlalchemy.sql import func
+
+from models import Question
+
+# Terms shorter than a trigram can not be answered by the search indexes
+MIN_INDEXED_TERM_LENGTH = 3
+
+# Search index of questions.question. On PostgreSQL, the pg_trgm GIN index
+# ix_questions_question_trgm (also in trivia.psql) serves ILIKE '%term%'.
+# On SQLite, an FTS5 trigram table kept in sync by triggers. Both are created
+# by db.create_all() together with the questions table
+SQLITE_INDEX = [
+  "CREATE VIRTUAL TABLE questions_question_fts USING fts5(question, content='questions', content_rowid='id', tokenize='trigram')",
+  "CREATE TRIGGER questions_question_fts_ai AFTER INSERT ON questions BEGIN "
+    "INSERT INTO questions_question_fts(rowid, question) VALUES (new.id, new.question); END",
+  "CREATE TRIGGER questions_question_fts_ad AFTER DELETE ON questions BEGIN "
+    "INSERT INTO questions_question_fts(questions_question_fts, rowid, question) VALUES ('delete', old.id, old.question); END",
+  "CREATE TRIGGER questions_question_fts_au AFTER UPDATE OF question ON questions BEGIN "
+    "INSERT INTO questions_question_fts(questions_question_fts, rowid, question) VALUES ('delete', old.id, old.question); "
+    "INSERT INTO questions_question_fts(rowid, question) VALUES (new.id, new.question); END"
+]
+POSTGRESQL_INDEX = [
+  'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+  'CREATE INDEX IF NOT EXISTS ix_questions_question_trgm ON questions USING gin (question gin_trgm_ops)'
+]
+
+for statement in SQLITE_INDEX:
+  event.listen(Question.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Question.__table__, 'before_drop',
+  DDL('DROP TABLE IF EXISTS questions_question_fts').execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_INDEX:
+  event.listen(Question.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+def limited(query, limit):
+  return query.all() if limit is None else query.limit(limit).all()
+
+# Case-insensitive substring match, on any database but scanning the table
+def like_search(term, limit=None):
+  return limited(Question.query
+    .filter(func.lower(Question.question).contains(term.lower(), autoescape=True))
+    .order_by(Question.question), limit)
+
+# ILIKE '%term%' answered by the trigram index, ranked by similarity
+def trigram_search(term, limit=None):
+  if len(term) < MIN_INDEXED_TERM_LENGTH:
+    return like_search(term, limit)
+  pattern = '%' + term.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+  return limited(Question.query
+    .filter(Question.question.ilike(pattern, escape='/'))
+    .order_by(func.similarity(Question.question, term).desc(), Question.question), limit)
+
+# Phrase match answered by the FTS5 table, ranked by bm25
+def fts_search(term, limit=None):
+  if len(term) < MIN_INDEXED_TERM_LENGTH:
+    return like_search(term, limit)
+  statement = text(
+    'SELECT questions.* FROM questions '
+    'JOIN questions_question_fts ON questions_question_fts.rowid = questions.id '
+    'WHERE questions_question_fts MATCH :term ORDER BY questions_question_fts.rank LIMIT :limit'
+  )
+  return Question.query.from_statement(statement) \
+    .params(term='"{}"'.format(term.replace('"', '""')), limit=-1 if limit is None else limit) \
+    .all()
+
+BACKENDS = {
+  'like': like_search,
+  'postgresql': trigram_search,
+  'sqlite': fts_search
+}
+
+'''
+search(term, limit, backend)
+    returns the questions whose text contains term, best matches first,
+    using the backend named by backend ('postgresql', 'sqlite' or 'like')
+    or, by default, the one matching the database dialect
+'''
+def search(term, limit=None, backend=None):
+  if backend is None:
+    backend = Question.query.session.get_bind(Question.__mapper__).dialect.name
+  return BACKENDS.get(backend, like_search)(term, limit)
@@ -0,0 +1,69 @@
+from itertools import chain
+from flask import Response, json, stream_with_context
+
+'''
+streamed(chunks, mimetype)
+    response sending chunks as they are produced, the request context (and
+    with it the database session) staying open until the last one is sent
+    the first chunk is produced before the response starts, so an error
+    reading the first rows is raised by the view instead of cutting a 200
+    body short; an error in a later chunk aborts the chunked transfer
+'''
+def streamed(chunks, mimetype):
+  chunks = iter(chunks)
+  first = next(chunks, '')
+  return Response(stream_with_context(chain([first], chunks)), mimetype=mimetype)
+
+'''
+stream_json(key, items, head, tail, chunk_size)
+    streams a JSON object whose key member is the array of items, without
+    building the array (or the document) in memory
+    head holds the members written before the array; tail, when given, is
+    called with the number of items once they are all written and returns
+    the members written after it
+    items are encoded and sent chunk_size at a time, so when they come
+    from query.yield_per(chunk_size) the memory used stays flat however
+    many rows there are
+'''
+def stream_json(key, items, head=None, tail=None, chunk_size=100):
+  def members(fields):
+    return ','.join('{}:{}'.format(json.dumps(name), json.dumps(value)) for name, value in fields.items())
+
+  def generate():
+    opening = members(head or {})
+    # sent with the first chunk of items, which reads the first rows
+    prefix = '{' + (opening + ',' if opening else '') + json.dumps(key) + ':['
+    count = 0
+    chunk = []
+    for item in items:
+      chunk.append(json.dumps(item))
+      if len(chunk) == chunk_size:
+        yield prefix + (',' if count else '') + ','.join(chunk)
+        prefix = ''
+        count += len(chunk)
+        chunk = []
+    if chunk:
+      yield prefix + (',' if count else '') + ','.join(chunk)
+      prefix = ''
+      count += len(chunk)
+    closing = members(tail(count)) if tail is not None else ''
+    yield prefix + ']' + (',' + closing if closing else '') + '}'
+
+  return streamed(generate(), 'application/json')
+
+'''
+stream_ndjson(items, chunk_size)
+    streams items as newline-delimited JSON, chunk_size lines at a time
+'''
+def stream_ndjson(items, chunk_size=100):
+  def generate():
+    chunk = []
+    for item in items:
+      chunk.append(json.dumps(item) + '\n')
+      if len(chunk) == chunk_size:
+        yield ''.join(chunk)
+        chunk = []
+    if chunk:
+      yield ''.join(chunk)
+
+  return streamed(generate(), 'application/x-ndjson')
@@ -1,12 +1,14 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import time
+from sqlalchemy import Column, String, Integer, Float, create_engine, event
+from pool import PooledSQLAlchemy
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+# DATABASE_URL points the app to another database, e.g. sqlite:////tmp/trivia.db
+database_path = os.environ.get('DATABASE_URL', "postgres://{}/{}".format('localhost:5432', database_name))
 
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 
 '''
 setup_db(app)
@@ -15,6 +17,9 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if database_path.startswith('postgres'):
+        # Send executemany() INSERTs, such as bulk imports, as multi-row VALUES
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {'executemany_mode': 'values'})
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -29,7 +34,7 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -75,4 +80,25 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+TableVersion
+    change counter of a table, or of part of one such as the questions of a
+    category, and time of its last change (seconds since the epoch), bumped
+    by the writes to it, see flaskr/conditional.py
+'''
+class TableVersion(db.Model):
+  __tablename__ = 'table_versions'
+
+  name = Column(String(64), primary_key=True)
+  version = Column(Integer, nullable=False)
+  modified = Column(Float, nullable=False)
+
+# One row per table from the start, so that conditional() finds them all
+@event.listens_for(TableVersion.__table__, 'after_create')
+def create_table_versions(target, connection, **kw):
+  connection.execute(target.insert(), [
+    {'name': name, 'version': 0, 'modified': time.time()}
+    for name in db.metadata.tables if name != target.name
+  ])
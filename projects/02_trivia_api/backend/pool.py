@@ -0,0 +1,70 @@
+import time
+from flask import g, has_app_context, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+'''
+PooledSQLAlchemy
+    SQLAlchemy whose PostgreSQL engine is sized by the DB_POOL_* settings
+    of create_app(), with a pool that times how long checkouts wait
+'''
+class PooledSQLAlchemy(SQLAlchemy):
+  def apply_driver_hacks(self, app, sa_url, options):
+    super().apply_driver_hacks(app, sa_url, options)
+    if sa_url.drivername != 'sqlite':
+      options.update(
+        poolclass=TimedQueuePool,
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+        pool_pre_ping=app.config['DB_POOL_PRE_PING']
+      )
+
+class TimedQueuePool(QueuePool):
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      return super()._do_get()
+    finally:
+      if has_app_context():
+        g.db_checkout_wait = g.get('db_checkout_wait', 0) + time.perf_counter() - start
+
+'''
+log_database_metrics(app, db)
+    with DB_METRICS_LOG, logs after each request the SQL statements it ran,
+    their time, how long it waited for a connection, and the connections
+    of the pool checked out and idle
+'''
+def log_database_metrics(app, db):
+  if not app.config['DB_METRICS_LOG']:
+    return
+
+  @event.listens_for(db.engine, 'before_cursor_execute')
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+  @event.listens_for(db.engine, 'after_cursor_execute')
+  def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_app_context():
+      g.db_statements = g.get('db_statements', 0) + 1
+      g.db_statement_seconds = g.get('db_statement_seconds', 0) + elapsed
+
+  @event.listens_for(db.engine, 'handle_error')
+  def handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+      context.connection.info['query_started'].pop()
+
+  @app.after_request
+  def log_request_statements(response):
+    pool = db.engine.pool
+    if isinstance(pool, QueuePool):
+      state = '{} checked out, {} idle'.format(pool.checkedout(), pool.checkedin())
+    else:
+      state = 'not pooled'
+    app.logger.info('%s %s %s: %d statements in %.1f ms, %.1f ms waiting for a connection; pool: %s',
+      request.method, request.full_path, response.status_code, g.get('db_statements', 0),
+      g.get('db_statement_seconds', 0) * 1000, g.get('db_checkout_wait', 0) * 1000, state)
+    return response
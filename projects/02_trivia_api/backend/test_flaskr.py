@@ -1,33 +1,33 @@
 import os
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+from contextlib import ExitStack
+from sqlalchemy.exc import OperationalError
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, Question, Category, TableVersion
+from testing import app_config, seed, rolled_back
+from flaskr.repos import question_repo
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Create the app and load trivia.psql once, in TEST_DATABASE_URL."""
+        cls.app = create_app(app_config())
+        seed(db)
+
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Define test variables and run each test in a rolled back transaction."""
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
-
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
+        self.transaction = ExitStack()
+        self.transaction.enter_context(rolled_back(self.app))
     
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        self.transaction.close()
 
     def test_get_categories(self):
         res = self.client().get('/categories')
@@ -37,6 +37,13 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    def test_304_get_categories_not_modified(self):
+        res = self.client().get('/categories')
+        res = self.client().get('/categories', headers={'If-None-Match': res.headers['ETag']})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
     def test_get_paginated_questions(self):
         res = self.client().get('/questions')
         data = json.loads(res.data)
@@ -47,6 +54,32 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(data['categories'])
     
+    def test_get_questions_per_page(self):
+        res = self.client().get('/questions?per_page=5')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['next_after'], data['questions'][-1]['id'])
+
+    def test_get_questions_after_cursor(self):
+        first_page = json.loads(self.client().get('/questions?per_page=5').data)
+        res = self.client().get('/questions?per_page=5&after={}'.format(first_page['next_after']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(all(q['id'] > first_page['next_after'] for q in data['questions']))
+
+    def test_422_sent_requesting_invalid_page(self):
+        res = self.client().get('/questions?page=0')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertTrue(data['message'],'Unprocessable')
+
     def test_404_sent_requesting_beyond_valid_page(self):
         res = self.client().get('/questions?page=1000')
         data = json.loads(res.data)
@@ -88,16 +121,58 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertTrue(data['message'],'Unprocessable')
 
+    def test_bulk_post_questions(self):
+        before = self.client().get('/questions')
+        etag = before.headers['ETag']
+        res = self.client().post('/questions/bulk', json=[
+            {'question': 'Bulk question', 'answer': 'Bulk answer', 'difficulty': 1, 'category': 1},
+            {'question': 'Bulk question', 'answer': 'Bulk answer', 'category': 1},
+            {'question': 'Bulk question', 'answer': 'Bulk answer', 'difficulty': 1, 'category': 1000}
+        ])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['total_errors'], 2)
+        self.assertEqual([error['index'] for error in data['errors']], [1, 2])
+        res = self.client().get('/questions', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['total_questions'], json.loads(before.data)['total_questions'] + 1)
+
+    def test_bulk_post_questions_ndjson(self):
+        lines = [json.dumps({'question': 'Bulk question', 'answer': 'Bulk answer', 'difficulty': 2, 'category': 2})] * 3
+        res = self.client().post('/questions/bulk', data='\n'.join(lines + ['not json']),
+            content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 3)
+        self.assertEqual(data['errors'], [{'index': 3, 'error': 'not a JSON object'}])
+
+    def test_422_bulk_post_questions_not_array(self):
+        res = self.client().post('/questions/bulk', json={'question': 'Bulk question'})
+
+        self.assertEqual(res.status_code, 422)
+
+    def test_export_questions(self):
+        res = self.client().get('/questions/export')
+        questions = [json.loads(line) for line in res.data.decode().splitlines()]
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(questions), total)
+        self.assertTrue(all('question' in question for question in questions))
+
     def test_search_question(self):
         res = self.client().post('/questions/search', json={
-            'searchTerm': 'test',
+            'searchTerm': 'soccer',
         })
         data = json.loads(res.data)
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue(data['questions'])
-        self.assertTrue(data['total_questions'])
+        self.assertEqual(data['total_questions'], 2)
 
     def test_422_search_question_without_searchterm(self):
         res = self.client().post('/questions/search', json={})
@@ -115,7 +190,111 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
+
+    def test_get_questions_by_category_streamed(self):
+        whole = json.loads(self.client().get('categories/1/questions').data)
+        chunk_size = self.app.config['STREAM_CHUNK_SIZE']
+        self.app.config['STREAM_CHUNK_SIZE'] = 1
+        try:
+            res = self.client().get('categories/1/questions')
+        finally:
+            self.app.config['STREAM_CHUNK_SIZE'] = chunk_size
+        # reading res.data buffers the response
+        self.assertTrue(res.is_streamed)
+        data = json.loads(res.data)
+
+        self.assertEqual(data, whole)
+        self.assertEqual(data['total_questions'], len(data['questions']))
     
+    def test_get_questions_by_category_fails_before_streaming(self):
+        def by_category(category, chunk_size):
+            raise OperationalError('SELECT', {}, Exception('connection lost'))
+            yield
+
+        question_repo.by_category = by_category
+        try:
+            # raised by the view, not after a 200 status was sent
+            with self.assertRaises(OperationalError):
+                self.client().get('categories/1/questions')
+        finally:
+            del question_repo.by_category
+
+    def test_question_repo_lookups(self):
+        with self.app.app_context():
+            by_id = [q.id for q in question_repo.by_category(1, 100)]
+            by_one = [q.id for q in question_repo.by_category(1, 1)]
+            question = question_repo.get(by_id[0])
+            missing = question_repo.get(1000)
+
+        self.assertEqual(by_id, [20, 21, 22])
+        self.assertEqual(by_one, by_id)
+        self.assertEqual(question.category, 1)
+        self.assertIsNone(missing)
+
+    def test_post_quizz_returns_unasked_question(self):
+        questions = json.loads(self.client().get('categories/0/questions').data)['questions']
+        previous_questions = [q['id'] for q in questions[1:]]
+        res = self.client().post('/quizzes', json={
+            'previous_questions': previous_questions,
+            'quiz_category': {
+                'type': 'Science',
+                'id': 0
+            }
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], questions[0]['id'])
+
+    def test_post_quizz_all_questions_asked(self):
+        questions = json.loads(self.client().get('categories/0/questions').data)['questions']
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [q['id'] for q in questions],
+            'quiz_category': {
+                'type': 'Science',
+                'id': 0
+            }
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question'], None)
+
+    def test_post_quizz_draws_question_added_elsewhere(self):
+        questions = json.loads(self.client().get('categories/0/questions').data)['questions']
+        quiz = {
+            'previous_questions': [q['id'] for q in questions],
+            'quiz_category': {
+                'type': 'Science',
+                'id': 0
+            }
+        }
+        self.assertEqual(json.loads(self.client().post('/quizzes', json=quiz).data)['question'], None)
+
+        # written as another server process would, without this app's routes
+        question = Question('New question', 'New answer', 1, 1)
+        db.session.add(question)
+        db.session.commit()
+        res = self.client().post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], question.id)
+
+    def test_question_write_bumps_only_its_category(self):
+        def versions():
+            rows = db.session.query(TableVersion.name, TableVersion.version).filter(
+                TableVersion.name.in_(['questions/1', 'questions/2'])).all()
+            return dict(rows)
+
+        before = versions()
+        db.session.add(Question('New question', 'New answer', 2, 1))
+        db.session.commit()
+        after = versions()
+
+        self.assertEqual(after.get('questions/1'), before.get('questions/1'))
+        self.assertEqual(after['questions/2'], before.get('questions/2', 0) + 1)
+
     def test_404_post_quizz_category_id_not_found(self):
         res = self.client().post('/quizzes', json={
             'previous_questions': [],
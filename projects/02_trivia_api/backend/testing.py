@@ -0,0 +1,145 @@
+import os
+import re
+from contextlib import contextmanager
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, orm, text
+
+from models import db
+
+# Database of the tests: an in-memory SQLite database by default, so they
+# need no server, or e.g. sqlite:////tmp/trivia_test.db for a temporary file
+# or postgres://localhost:5432/trivia_test
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+TRIVIA_PSQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+COPY = re.compile(r'^COPY (?:\w+\.)?(\w+) \(([^)]*)\) FROM stdin;$')
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+'''
+app_config(database_url)
+    create_app() settings of the tests
+'''
+def app_config(database_url=TEST_DATABASE_URL):
+  return {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': database_url
+  }
+
+def unescape(value):
+  if value == '\\N':
+    return None
+  return re.sub(r'\\(.)', lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), value)
+
+'''
+read_psql(path)
+    yields (table name, rows) for each COPY block of a pg_dump file, the
+    rows being dicts of column name to text (None for NULL)
+'''
+def read_psql(path=TRIVIA_PSQL):
+  table = None
+  with open(path, encoding='utf-8') as f:
+    for line in f:
+      line = line.rstrip('\n')
+      if table is None:
+        match = COPY.match(line)
+        if match:
+          table, columns, rows = match.group(1), [c.strip() for c in match.group(2).split(',')], []
+      elif line == '\\.':
+        yield table, rows
+        table = None
+      else:
+        rows.append(dict(zip(columns, [unescape(value) for value in line.split('\t')])))
+
+'''
+load_psql(db, path)
+    inserts the rows of a pg_dump file, by default trivia.psql, into the
+    tables of db created by db.create_all(), each value converted to the
+    type of its column; on PostgreSQL the id sequences are then moved past
+    the loaded ids
+'''
+def load_psql(db, path=TRIVIA_PSQL):
+  with db.engine.begin() as connection:
+    for name, rows in read_psql(path):
+      table = db.metadata.tables[name]
+      connection.execute(table.insert(), [{
+        column: None if value is None else table.c[column].type.python_type(value)
+        for column, value in row.items()
+      } for row in rows])
+      if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+          "SELECT setval(pg_get_serial_sequence('{0}', 'id'), max(id)) FROM {0}".format(name)
+        ))
+
+'''
+seed(db)
+    loads trivia.psql once into an empty database, returns whether it did
+'''
+def seed(db):
+  with db.engine.connect() as connection:
+    if connection.execute(db.metadata.tables['categories'].select().limit(1)).first() is not None:
+      return False
+  load_psql(db)
+  return True
+
+'''
+SavepointSession
+    session of rolled_back(), working in a SAVEPOINT begun again whenever
+    the code under test commits or rolls back, and rolled back on close()
+    the Fyyur tests use the same class (projects/01_fyyur/testing.py):
+    change both together
+'''
+class SavepointSession(SignallingSession):
+  def __init__(self, db, **options):
+    super().__init__(db, **options)
+    self.closing = False
+    event.listen(self, 'after_transaction_end', self.restart_savepoint)
+    self.begin_nested()
+
+  def restart_savepoint(self, session, transaction):
+    if transaction.nested and not transaction._parent.nested and not self.closing:
+      self.expire_all()
+      self.begin_nested()
+
+  def close(self):
+    self.closing = True
+    try:
+      self.rollback()
+      super().close()
+    finally:
+      self.closing = False
+    self.begin_nested()
+
+'''
+rolled_back(app)
+    context manager running its block in a transaction rolled back on exit,
+    so each test starts from the seeded database without reloading it, and
+    then dropping the caches of app, which may hold the rolled back rows
+    db.session is bound to a single connection, its sessions are
+    SavepointSessions so the routes can commit and roll back
+'''
+@contextmanager
+def rolled_back(app):
+  connection = db.engine.connect()
+  isolation_level = None
+  if connection.dialect.name == 'sqlite':
+    # pysqlite begins transactions on its own and loses the SAVEPOINTs,
+    # let SQLAlchemy emit BEGIN instead
+    isolation_level = connection.connection.isolation_level
+    connection.connection.isolation_level = None
+    event.listen(connection, 'begin', lambda conn: conn.execute('BEGIN'))
+  transaction = connection.begin()
+  app_session = db.session
+  db.session = orm.scoped_session(
+    orm.sessionmaker(class_=SavepointSession, db=db, bind=connection, binds={}),
+    scopefunc=app_session.registry.scopefunc
+  )
+  try:
+    yield connection
+  finally:
+    db.session.remove()
+    db.session = app_session
+    transaction.rollback()
+    if isolation_level is not None:
+      connection.connection.isolation_level = isolation_level
+    connection.close()
+    app.extensions['clear_caches']()
@@ -0,0 +1,120 @@
+'''
+Benchmark of the auth path of the API, offline
+
+Mints tokens with the bundled development key (see src/auth/local_issuer.py)
+and measures the requests per second and latency of
+
+  - header:   get_token_auth_header, verify_decode_jwt and check_permissions
+              called directly, i.e. a full RS256 verification per token
+  - verify:   a request through requires_auth with a new token each time
+  - cached:   a request through requires_auth reusing a verified token
+  - api:      GET /drinks-detail of src/api.py with a cached token (--api,
+              recreates the development database like the API does)
+
+  python -m benchmarks.auth --requests 5000 --json auth.json
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+os.environ.setdefault('LOCAL_AUTH', 'true')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from src.auth import auth
+from src.auth.local_issuer import mint_token
+
+PERMISSION = 'get:drinks-detail'
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def measure(name, run, requests):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        request_start = time.perf_counter()
+        run(i)
+        latencies.append(time.perf_counter() - request_start)
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    result = {
+        'scenario': name,
+        'requests': requests,
+        'requests_per_second': round(requests / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+    }
+    print('{scenario:>8}: {requests_per_second:>9.1f} req/s  p50 {p50_ms:.3f} ms  p99 {p99_ms:.3f} ms'.format(**result))
+    return result
+
+
+def auth_app():
+    app = Flask(__name__)
+
+    @app.route('/protected')
+    @auth.requires_auth(PERMISSION)
+    def protected(payload):
+        return 'ok'
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--api', action='store_true', help='also benchmark GET /drinks-detail of src/api.py')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    if not auth.LOCAL_AUTH:
+        parser.error('LOCAL_AUTH is off, the minted tokens would be rejected')
+
+    tokens = [mint_token([PERMISSION]) for _ in range(args.requests)]
+    headers = [{'Authorization': 'Bearer ' + token} for token in tokens]
+    # warm up the JWKS
+    auth.verify_decode_jwt(tokens[0])
+
+    app = auth_app()
+    client = app.test_client()
+
+    def header(i):
+        with app.test_request_context(headers=headers[i]):
+            token = auth.get_token_auth_header()
+            auth.check_permissions(PERMISSION, auth.verify_decode_jwt(token))
+
+    def verify(i):
+        assert client.get('/protected', headers=headers[i]).status_code == 200
+
+    def cached(i):
+        assert client.get('/protected', headers=headers[0]).status_code == 200
+
+    results = [
+        measure('header', header, args.requests),
+        measure('verify', verify, args.requests),
+        measure('cached', cached, args.requests),
+    ]
+
+    if args.api:
+        from src.api import app as api
+        api_client = api.test_client()
+
+        def drinks_detail(i):
+            assert api_client.get('/drinks-detail', headers=headers[0]).status_code == 200
+
+        results.append(measure('api', drinks_detail, args.requests))
+
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,38 +5,60 @@ import json
 from flask_cors import CORS
 from jose import jwt
 
-from .database.models import db_drop_and_create_all, setup_db, Drink, db
+from .database.models import db_drop_and_create_all, setup_db, Drink, db, drink_menu
+from .database.pool import log_request_statements
+from .database.repos import drink_repo
 from .auth.auth import AuthError, requires_auth
+from .conditional import conditional_response
+from .streaming import stream_json
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+# SQL statements and connection pool state of each request, see DB_METRICS_LOG
+log_request_statements(app, db)
 
 db_drop_and_create_all()
 
+# Drinks read from the database, and encoded, at a time by /drinks-detail
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 100))
+
 ## ROUTES
+# Recipe blob of a request body: a list of ingredients, as sent by the
+# frontend, or a single ingredient, as in the Postman collection
+def recipe_blob(recipe):
+    if not isinstance(recipe, list):
+        recipe = [recipe]
+    return json.dumps(recipe)
+
+# Serialized drinks menu in the given representation ('short' or 'long'),
+# built from the database only when drink_menu has no copy of the current
+# version, with the ETag of that version
+def drinks_menu_response(representation):
+    state, body = drink_menu.get(representation, lambda: json.dumps({
+        'success':True,
+        'drinks':[getattr(drink, representation)() for drink in drink_repo.all()]
+    }))
+    return conditional_response(state, app.response_class(body, mimetype='application/json'))
+
 # Get list of all drinks via GET
 @app.route('/drinks', methods=['GET'])
 def show_drinks():
     try:
-        drinks = [drink.short() for drink in Drink.query.all()]
-        return jsonify({
-            'success':True,
-            'drinks':drinks
-        })
+        return drinks_menu_response('short')
     except:
         abort (404)
 
 # Get drink details via GET, with required authorization
+# The long representation carries every recipe, so it is streamed from a
+# server-side cursor instead of being built (and cached) in memory
 @app.route('/drinks-detail', methods=['GET'])
 @requires_auth('get:drinks-detail')
 def show_drinks_detail(jwt):
     try:
-        drinks = [drink.long() for drink in Drink.query.all()]
-        return jsonify({
-            'success':True,
-            'drinks':drinks
-        })
+        drinks = drink_repo.all(STREAM_CHUNK_SIZE)
+        return stream_json('drinks', (drink.long() for drink in drinks),
+            head={'success':True}, chunk_size=STREAM_CHUNK_SIZE)
     except:
         abort (404)
 
@@ -50,8 +72,10 @@ def post_new_drink(jwt):
       new_recipe = req_data.get('recipe', None)
       new_drink = Drink(
         title = new_title,
-        recipe = json.dumps([new_recipe])
+        recipe = recipe_blob(new_recipe)
       )
+      # a recipe the menu cannot show is rejected before it is stored
+      new_drink.parsed_recipe()
       new_drink.insert()
       return jsonify({
           'success':True,
@@ -66,7 +90,7 @@ def post_new_drink(jwt):
 @requires_auth('patch:drinks')
 def patch_drink(jwt,id):
     try:
-      drink = Drink.query.filter(Drink.id == id).one_or_none()
+      drink = drink_repo.get(id)
       if drink == None:
           abort(404)
       req_data = request.get_json()
@@ -75,7 +99,8 @@ def patch_drink(jwt,id):
       if new_title:
         drink.title = new_title
       if new_recipe:
-        drink.recipe = json.dumps([new_recipe])
+        drink.recipe = recipe_blob(new_recipe)
+        drink.parsed_recipe()
       drink.update()
       return jsonify({
           'success':True,
@@ -91,7 +116,7 @@ def patch_drink(jwt,id):
 def delete_drink(jwt,id):
     try:
       req_data = request.get_json()
-      drink = Drink.query.filter(Drink.id == id).one_or_none()
+      drink = drink_repo.get(id)
       if drink == None:
           abort(404)
       drink.delete()
@@ -1,13 +1,40 @@
-import json
+import os
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
+from jose import jwk, jwt
 
+from .jwks import AsyncJWKSKeyStore
+from .token_cache import VerifiedTokenCache
+from .local_issuer import LOCAL_ISSUER, LOCAL_JWKS_URL
 
-AUTH0_DOMAIN = 'jaimeam.eu.auth0.com'
+
+# LOCAL_AUTH=true trusts the tokens minted offline with the bundled key pair
+# (see local_issuer.py) instead of Auth0's, for development and benchmarks
+LOCAL_AUTH = os.environ.get('LOCAL_AUTH', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'jaimeam.eu.auth0.com')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = 'coffeeshop'
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'coffeeshop')
+# iss claim the tokens must carry
+JWT_ISSUER = os.environ.get('JWT_ISSUER', LOCAL_ISSUER if LOCAL_AUTH else f'https://{AUTH0_DOMAIN}/')
+
+# Signing keys are fetched from JWKS_URL and cached for JWKS_TTL seconds.
+# JWKS_URL may point to a local file (file:///...) to run without Auth0.
+# A request waits JWKS_WAIT seconds at most for keys being fetched, then
+# falls back to the last keys fetched; a fetch is given up after
+# JWKS_TIMEOUT seconds
+JWKS_URL = os.environ.get('JWKS_URL', LOCAL_JWKS_URL if LOCAL_AUTH else f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+JWKS_TTL = int(os.environ.get('JWKS_TTL', 600))
+JWKS_WAIT = float(os.environ.get('JWKS_WAIT', 1))
+JWKS_TIMEOUT = float(os.environ.get('JWKS_TIMEOUT', 5))
+
+jwks = AsyncJWKSKeyStore(JWKS_URL, ttl=JWKS_TTL, timeout=JWKS_TIMEOUT, wait=JWKS_WAIT)
+
+# Payloads of already verified tokens, kept until the token expires so
+# repeated requests with the same token skip the RS256 verification
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+verified_tokens = VerifiedTokenCache(TOKEN_CACHE_SIZE)
 
 ## AuthError Exception
 '''
@@ -67,11 +94,25 @@ def check_permissions(permission, payload):
         }, 403)
     return True
 
+# RSA public keys built from the JWKS, by kid and modulus: building one
+# costs more than verifying a signature with it
+public_keys = {}
+
+def public_key(key):
+    index = (key['kid'], key['n'], key['e'])
+    rsa_key = public_keys.get(index)
+    if rsa_key is None:
+        rsa_key = jwk.construct({
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }, ALGORITHMS[0])
+        public_keys[index] = rsa_key
+    return rsa_key
+
 def verify_decode_jwt(token):
-    # GET THE PUBLIC KEY FROM AUTH0
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    
     # GET THE DATA IN THE HEADER
     unverified_header = jwt.get_unverified_header(token)
     
@@ -83,15 +124,10 @@ def verify_decode_jwt(token):
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    # GET THE PUBLIC KEY FROM THE CACHED AUTH0 JWKS
+    key = jwks.get(unverified_header['kid'])
+    if key:
+        rsa_key = public_key(key)
     
     # Finally, verify!!!
     if rsa_key:
@@ -102,7 +138,7 @@ def verify_decode_jwt(token):
                 rsa_key,
                 algorithms=ALGORITHMS,
                 audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
+                issuer=JWT_ISSUER
             )
 
             return payload
@@ -133,10 +169,13 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
+            payload = verified_tokens.get(token)
+            if payload is None:
+                try:
+                    payload = verify_decode_jwt(token)
+                except:
+                    abort(401)
+                payload = verified_tokens.put(token, payload)
             check_permissions(permission, payload)
             return f(payload, *args, **kwargs)
         return wrapper
@@ -0,0 +1,160 @@
+import os
+import json
+import asyncio
+import threading
+import time
+from urllib.request import urlopen
+
+
+'''
+JWKSKeyStore
+    caches the signing keys published at a JWKS url, indexed by kid
+
+    - keys are fetched once and reused for ttl seconds
+    - once stale, lookups keep answering from the cached keys while a
+      background thread fetches the new set (stale-while-revalidate)
+    - a kid that is not in the cache forces a synchronous refetch, at most
+      once every min_refetch_interval seconds, so keys rotated by the
+      identity provider are picked up without letting tokens with made up
+      kids trigger a fetch per request
+
+    the url can be any url urlopen understands, e.g. file:///path/jwks.json
+    for a local stand-in of the identity provider
+'''
+class JWKSKeyStore:
+    def __init__(self, url, ttl=600, min_refetch_interval=30, timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+        return {key['kid']: key for key in jwks['keys'] if 'kid' in key}
+
+    def refresh(self):
+        keys = self.fetch()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+        return keys
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Keep serving the stale keys, the next lookup will try again
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    '''
+    get(kid)
+        returns the JWK with the given kid, or None if the JWKS does not
+        publish it
+    '''
+    def get(self, kid):
+        now = time.monotonic()
+        with self._lock:
+            fetched_at = self._fetched_at
+            key = self._keys.get(kid)
+            stale = fetched_at is not None and now - fetched_at >= self.ttl
+            start_refresh = stale and key is not None and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        if key is not None:
+            return key
+
+        if fetched_at is None or now - fetched_at >= self.min_refetch_interval:
+            return self.refresh().get(kid)
+        return None
+
+
+'''
+AsyncJWKSKeyStore
+    JWKSKeyStore whose fetches run on an asyncio event loop in a background
+    thread, so a slow identity provider never holds a request for longer
+    than wait seconds
+
+    - concurrent lookups that need the keys share a single in-flight
+      fetch, whatever kid they ask for
+    - a lookup missing its kid waits for that fetch at most wait seconds;
+      past that, or if the fetch fails, it answers from the last known
+      good keys while the fetch carries on (up to timeout seconds)
+    - stale keys are served at once and refreshed in the background, and
+      fetches start at most once every min_refetch_interval seconds, also
+      when the previous one failed
+
+    fetches run fetch(), i.e. urlopen with its proxy settings and
+    redirects, in the loop's executor
+'''
+class AsyncJWKSKeyStore(JWKSKeyStore):
+    def __init__(self, url, ttl=600, min_refetch_interval=30, timeout=5, wait=1):
+        super().__init__(url, ttl, min_refetch_interval, timeout)
+        self.wait = wait
+        self._attempted_at = None
+        self._inflight = None
+        self._loop = None
+        self._loop_pid = None
+
+    def _event_loop(self):
+        # the loop thread does not survive a fork, each worker starts its own
+        if self._loop is None or self._loop_pid != os.getpid():
+            self._loop = asyncio.new_event_loop()
+            self._loop_pid = os.getpid()
+            self._inflight = None
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    async def fetch_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch)
+
+    async def _refresh_async(self):
+        keys = await asyncio.wait_for(self.fetch_async(), self.timeout)
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+        return keys
+
+    '''
+    refresh_async()
+        starts fetching the keys, unless a fetch is already in flight, and
+        returns the concurrent.futures.Future of the new keys
+    '''
+    def refresh_async(self):
+        with self._lock:
+            if self._inflight is None or self._inflight.done():
+                self._attempted_at = time.monotonic()
+                self._inflight = asyncio.run_coroutine_threadsafe(self._refresh_async(), self._event_loop())
+            return self._inflight
+
+    def get(self, kid):
+        now = time.monotonic()
+        with self._lock:
+            key = self._keys.get(kid)
+            stale = self._fetched_at is None or now - self._fetched_at >= self.ttl
+            may_fetch = self._attempted_at is None or now - self._attempted_at >= self.min_refetch_interval
+            inflight = self._inflight is not None and not self._inflight.done()
+
+        if key is not None:
+            if stale and may_fetch:
+                self.refresh_async()
+            return key
+        if not (may_fetch or inflight):
+            return None
+
+        try:
+            return self.refresh_async().result(timeout=self.wait).get(kid)
+        except Exception:
+            # Too slow or failed, the fetch goes on in the background
+            with self._lock:
+                return self._keys.get(kid)
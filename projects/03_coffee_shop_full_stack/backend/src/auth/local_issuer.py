@@ -0,0 +1,81 @@
+'''
+Offline token issuer, for development, tests and benchmarks
+
+Signs tokens with the key pair bundled in ./dev_keys, whose public half is
+served as a JWKS by LOCAL_JWKS_URL. Run the API with LOCAL_AUTH=true to
+verify them instead of Auth0 tokens, then mint one per role with
+
+  python -m src.auth.local_issuer barista
+  python -m src.auth.local_issuer manager --expires-in 86400
+
+The private key is published with the code: never set LOCAL_AUTH on a
+server reachable by others.
+'''
+import os
+import time
+import uuid
+import argparse
+from jose import jwk, jwt
+
+
+DEV_KEYS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dev_keys')
+LOCAL_PRIVATE_KEY = os.path.join(DEV_KEYS_DIR, 'private.pem')
+LOCAL_JWKS_URL = 'file://' + os.path.join(DEV_KEYS_DIR, 'jwks.json')
+LOCAL_KID = 'coffee-shop-dev'
+LOCAL_ISSUER = 'http://localhost/coffee-shop-dev/'
+
+# Permissions of the Auth0 roles described in the README
+ROLES = {
+    'barista': ['get:drinks-detail'],
+    'manager': ['get:drinks-detail', 'post:drinks', 'patch:drinks', 'delete:drinks'],
+}
+
+_private_key = None
+
+
+def private_key():
+    # loading a RSA private key is much slower than signing with it
+    global _private_key
+    if _private_key is None:
+        with open(LOCAL_PRIVATE_KEY) as key_file:
+            _private_key = jwk.construct(key_file.read(), 'RS256')
+    return _private_key
+
+
+'''
+mint_token(permissions, audience, issuer, expires_in, subject)
+    returns a RS256 token signed with the bundled key, carrying the given
+    permissions like an Auth0 access token with RBAC enabled
+    audience defaults to the API_AUDIENCE verified by auth.py
+'''
+def mint_token(permissions, audience=None, issuer=LOCAL_ISSUER, expires_in=3600, subject=None):
+    if audience is None:
+        from .auth import API_AUDIENCE as audience
+    now = int(time.time())
+    claims = {
+        'iss': issuer,
+        'sub': subject or 'local|' + uuid.uuid4().hex,
+        'aud': audience,
+        'iat': now,
+        'exp': now + expires_in,
+        'permissions': list(permissions)
+    }
+    return jwt.encode(claims, private_key(), algorithm='RS256', headers={'kid': LOCAL_KID})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mint a token signed with the bundled development key.')
+    parser.add_argument('role', nargs='?', choices=sorted(ROLES), help='grant the permissions of this role')
+    parser.add_argument('--permission', action='append', default=[], help='grant this permission (repeatable)')
+    parser.add_argument('--expires-in', type=int, default=3600, help='seconds the token is valid (3600)')
+    parser.add_argument('--subject', help='sub claim (a random one by default)')
+    parser.add_argument('--audience', help='aud claim (API_AUDIENCE by default)')
+    parser.add_argument('--issuer', default=os.environ.get('JWT_ISSUER', LOCAL_ISSUER), help='iss claim')
+    args = parser.parse_args(argv)
+
+    permissions = ROLES.get(args.role, []) + args.permission
+    print(mint_token(permissions, args.audience, args.issuer, args.expires_in, args.subject))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import time
+import hashlib
+import threading
+from types import MappingProxyType
+from collections import OrderedDict
+
+
+'''
+VerifiedTokenCache
+    bounded LRU cache of the payloads of tokens that already passed
+    verification, keyed by the SHA-256 of the token
+
+    a cached payload is dropped at the token's exp, so an expired token
+    is always verified (and rejected) again; tokens without exp are never
+    cached. payloads are returned read-only, with permissions frozen into
+    a frozenset so permission checks are O(1)
+'''
+class VerifiedTokenCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    '''
+    get(token)
+        returns the cached payload of token, or None if token has not been
+        verified yet or has expired since
+    '''
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    '''
+    put(token, payload)
+        caches the verified payload of token and returns its read-only form
+    '''
+    def put(self, token, payload):
+        payload = dict(payload)
+        if 'permissions' in payload:
+            payload['permissions'] = frozenset(payload['permissions'])
+        payload = MappingProxyType(payload)
+
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)) or self.maxsize <= 0:
+            return payload
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
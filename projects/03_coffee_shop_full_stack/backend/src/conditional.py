@@ -0,0 +1,30 @@
+import time
+import hashlib
+from datetime import timezone
+from flask import request, make_response
+
+'''
+conditional_response(state, response)
+    adds ETag and Last-Modified headers derived from the MenuVersion state
+    (version, modified) the body of response was built at, and answers
+    If-None-Match / If-Modified-Since with an empty 304 instead
+'''
+def conditional_response(state, response):
+    if state is None:
+        last_modified = int(time.time())
+    else:
+        last_modified = int(state[1])
+    etag = hashlib.sha1('{}:{}'.format(state, request.full_path).encode('utf-8')).hexdigest()
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        not_modified = since is not None and since.timestamp() >= last_modified
+
+    if not_modified:
+        response = make_response('', 304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
@@ -1,13 +1,17 @@
 import os
-from sqlalchemy import Column, String, Integer
-from flask_sqlalchemy import SQLAlchemy
+import time
+import threading
+from sqlalchemy import Column, String, Integer, Float, event
+from .pool import PooledSQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+# DATABASE_URL selects another database, e.g. a scratch one for benchmarks
+database_path = os.environ.get('DATABASE_URL', database_path)
 
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 
 '''
 setup_db(app)
@@ -29,6 +33,81 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+MenuVersion
+a single row counting the changes made to the drinks, and the time of the
+last one, shared by every server process (see src/conditional.py)
+'''
+class MenuVersion(db.Model):
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    modified = Column(Float, nullable=False)
+
+    '''
+    bump()
+        counts a change to the drinks, in the transaction that makes it
+    '''
+    @staticmethod
+    def bump():
+        db.session.query(MenuVersion).update({
+            MenuVersion.version: MenuVersion.version + 1,
+            MenuVersion.modified: time.time()
+        }, synchronize_session=False)
+
+    '''
+    state()
+        returns the (version, modified) of the drinks, read from the
+        database (not from the session), or None before the row exists
+    '''
+    @staticmethod
+    def state():
+        row = db.session.query(MenuVersion.version, MenuVersion.modified) \
+            .filter(MenuVersion.id == 1).first()
+        return None if row is None else tuple(row)
+
+@event.listens_for(MenuVersion.__table__, 'after_create')
+def create_menu_version(target, connection, **kw):
+    connection.execute(target.insert().values(id=1, version=0, modified=time.time()))
+
+'''
+DrinkMenuCache
+    keeps the serialized drinks menu, one entry per representation
+    ('short' for /drinks), together with the MenuVersion state it was
+    built at; an entry is rebuilt once the drinks changed in any server
+    process, and the state is returned with it so that the ETag always
+    describes the body it is sent with
+'''
+class DrinkMenuCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    '''
+    get(name, build)
+        returns the (state, value) of the entry name, calling build() to
+        create it when it is missing or older than the current MenuVersion
+    '''
+    def get(self, name, build):
+        state = MenuVersion.state()
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry[0] == state:
+            return entry
+        # the version is read before the drinks, so a menu is never newer
+        # than the state it is stored with
+        entry = (state, build())
+        with self._lock:
+            current = self._entries.get(name)
+            if state is not None and (current is None or current[0] < state):
+                self._entries[name] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+
+drink_menu = DrinkMenuCache()
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -42,16 +121,29 @@ class Drink(db.Model):
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe =  Column(String(180), nullable=False)
 
+    '''
+    parsed_recipe()
+        returns the (long, short) forms of the recipe blob
+        they are parsed once and kept on the instance until recipe changes
+    '''
+    def parsed_recipe(self):
+        cached = getattr(self, '_parsed_recipe', None)
+        if cached is None or cached[0] != self.recipe:
+            long_recipe = json.loads(self.recipe)
+            short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in long_recipe]
+            cached = (self.recipe, long_recipe, short_recipe)
+            self._parsed_recipe = cached
+        return cached[1], cached[2]
+
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.parsed_recipe()[1]
         }
 
     '''
@@ -62,7 +154,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.parsed_recipe()[0]
         }
 
     '''
@@ -76,6 +168,7 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
+        MenuVersion.bump()
         db.session.commit()
 
     '''
@@ -88,6 +181,7 @@ class Drink(db.Model):
     '''
     def delete(self):
         db.session.delete(self)
+        MenuVersion.bump()
         db.session.commit()
 
     '''
@@ -100,6 +194,7 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        MenuVersion.bump()
         db.session.commit()
 
     def __repr__(self):
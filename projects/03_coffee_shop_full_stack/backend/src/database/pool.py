@@ -0,0 +1,84 @@
+import os
+import time
+from flask import g, has_app_context, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Connection pool of the engine when the database is not SQLite: connections
+# kept open, extra ones allowed under load, seconds to wait for a free one,
+# seconds before one is replaced, and whether they are tested before use
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = env_flag('DB_POOL_PRE_PING', True)
+# Log the statements of each request and the pool state
+DB_METRICS_LOG = env_flag('DB_METRICS_LOG')
+
+
+'''
+PooledSQLAlchemy
+    SQLAlchemy whose engine gets the DB_POOL_* settings above, unless the
+    database is SQLite
+'''
+class PooledSQLAlchemy(SQLAlchemy):
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername != 'sqlite':
+            options.update(
+                poolclass=TimedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING
+            )
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if has_app_context():
+                g.db_wait = g.get('db_wait', 0) + time.perf_counter() - start
+
+
+'''
+log_request_statements(app, db)
+    when DB_METRICS_LOG is set, logs after each request the statements it
+    ran on the engine of db, their time, the wait for a connection and
+    the connections checked out and idle
+'''
+def log_request_statements(app, db):
+    if not DB_METRICS_LOG:
+        return
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._started = time.perf_counter()
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context():
+            g.db_statements = g.get('db_statements', 0) + 1
+            g.db_time = g.get('db_time', 0) + time.perf_counter() - context._started
+
+    @app.after_request
+    def log_statements(response):
+        pool = db.engine.pool
+        app.logger.info('%s %s %s: %d statements in %.1f ms, %.1f ms waiting for a connection; %s',
+            request.method, request.full_path, response.status_code,
+            g.get('db_statements', 0), g.get('db_time', 0) * 1000, g.get('db_wait', 0) * 1000,
+            pool.status() if isinstance(pool, QueuePool) else 'not pooled')
+        return response
@@ -0,0 +1,37 @@
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+
+from .models import db, Drink
+
+# Baked queries of the drink endpoints, see projects/benchmarks/README.md
+bakery = baked.bakery()
+
+'''
+DrinkRepo
+    hot lookups of the drink endpoints
+'''
+class DrinkRepo:
+    _drink = bakery(lambda session: session.query(Drink)
+        .filter(Drink.id == bindparam('id')))
+    _drinks = bakery(lambda session: session.query(Drink)
+        .order_by(Drink.id))
+
+    '''
+    get(id)
+        returns the drink with the given id, or None
+    '''
+    def get(self, id):
+        return self._drink(db.session()).params(id=id).one_or_none()
+
+    '''
+    all(chunk_size)
+        returns every drink ordered by id, fetched chunk_size rows at a
+        time as they are iterated, or all at once without chunk_size
+    '''
+    def all(self, chunk_size=None):
+        query = self._drinks
+        if chunk_size is not None:
+            query = query.with_criteria(lambda q: q.yield_per(chunk_size), chunk_size)
+        return query(db.session())
+
+drink_repo = DrinkRepo()
@@ -0,0 +1,35 @@
+from itertools import chain
+from flask import Response, json, stream_with_context
+
+
+'''
+stream_json(key, items, head, chunk_size)
+    streams {<head members>, key: [items]} chunk_size items at a time,
+    e.g. the drinks of drink_repo.all(chunk_size), which are read from
+    the database as the response is sent
+    the first chunk is encoded before the response starts, so a drink
+    that cannot be read fails the view (and its error handling) instead
+    of cutting a 200 body short
+'''
+def stream_json(key, items, head=None, chunk_size=100):
+    opening = ''.join('{}:{},'.format(json.dumps(name), json.dumps(value)) for name, value in (head or {}).items())
+
+    def generate():
+        prefix = '{' + opening + json.dumps(key) + ':['
+        chunk = []
+        for item in items:
+            chunk.append(json.dumps(item))
+            if len(chunk) == chunk_size:
+                yield prefix + ','.join(chunk)
+                prefix, chunk = ',', []
+        if chunk:
+            yield prefix + ','.join(chunk)
+            prefix = ','
+        # the opening is still to be sent when there were no items
+        yield ('' if prefix == ',' else prefix) + ']}'
+
+    chunks = generate()
+    first = next(chunks)
+    # the request context (and with it the database session) stays open
+    # until the last chunk is sent
+    return Response(stream_with_context(chain([first], chunks)), mimetype='application/json')
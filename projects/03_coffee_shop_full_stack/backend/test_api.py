@@ -0,0 +1,163 @@
+import os
+import json
+import tempfile
+import unittest
+
+# src.api drops and creates the tables of DATABASE_URL when imported: point
+# it to TEST_DATABASE_URL, or to a scratch SQLite file
+handle, database_file = tempfile.mkstemp(suffix='.db')
+os.close(handle)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'sqlite:///' + database_file)
+
+from src.api import app
+from src.auth import auth, local_issuer
+from src.auth.jwks import JWKSKeyStore
+from src.database.models import db_drop_and_create_all, db, Drink, MenuVersion, drink_menu
+
+
+def tearDownModule():
+    os.remove(database_file)
+
+
+def recipe(*names):
+    return json.dumps([{'name': name, 'color': 'brown', 'parts': 1} for name in names])
+
+
+class DrinkMenuTestCase(unittest.TestCase):
+    """This class represents the drinks menu test case"""
+
+    def setUp(self):
+        """Start each test from empty tables and menu cache."""
+        with app.app_context():
+            db_drop_and_create_all()
+        drink_menu.invalidate()
+        self.client = app.test_client
+
+    def get_titles(self):
+        res = self.client().get('/drinks')
+        self.assertEqual(res.status_code, 200)
+        return [drink['title'] for drink in json.loads(res.data)['drinks']]
+
+    def test_drinks_follow_insert_update_delete(self):
+        self.assertEqual(self.get_titles(), [])
+
+        with app.app_context():
+            drink = Drink(title='Latte', recipe=recipe('milk'))
+            drink.insert()
+            drink_id = drink.id
+        self.assertEqual(self.get_titles(), ['Latte'])
+
+        with app.app_context():
+            drink = Drink.query.get(drink_id)
+            drink.title = 'Flat White'
+            drink.update()
+        self.assertEqual(self.get_titles(), ['Flat White'])
+
+        with app.app_context():
+            Drink.query.get(drink_id).delete()
+        self.assertEqual(self.get_titles(), [])
+
+    def test_menu_changed_by_another_process_is_rebuilt_with_its_etag(self):
+        with app.app_context():
+            Drink(title='Latte', recipe=recipe('milk')).insert()
+        res = self.client().get('/drinks')
+        etag = res.headers['ETag']
+
+        # another worker renames the drink: this process' menu copy is not
+        # told, only the shared version row changes
+        with app.app_context():
+            db.session.execute(Drink.__table__.update().values(title='Flat White'))
+            MenuVersion.bump()
+            db.session.commit()
+
+        res = self.client().get('/drinks')
+        self.assertEqual([drink['title'] for drink in json.loads(res.data)['drinks']], ['Flat White'])
+        self.assertNotEqual(res.headers['ETag'], etag)
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get('/drinks', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_parsed_recipe_follows_recipe(self):
+        drink = Drink(title='Mocha', recipe=recipe('coffee'))
+        self.assertEqual([r['name'] for r in drink.long()['recipe']], ['coffee'])
+
+        drink.recipe = recipe('coffee', 'chocolate')
+        self.assertEqual([r['name'] for r in drink.long()['recipe']], ['coffee', 'chocolate'])
+        self.assertEqual(len(drink.short()['recipe']), 2)
+
+
+class DrinkDetailTestCase(unittest.TestCase):
+    """This class represents the streamed drink details test case"""
+
+    def setUp(self):
+        """Start from empty tables, trusting tokens of the offline issuer."""
+        with app.app_context():
+            db_drop_and_create_all()
+        drink_menu.invalidate()
+        for name in ('jwks', 'JWT_ISSUER'):
+            self.addCleanup(setattr, auth, name, getattr(auth, name))
+        self.addCleanup(auth.verified_tokens.clear)
+        auth.jwks = JWKSKeyStore(local_issuer.LOCAL_JWKS_URL)
+        auth.JWT_ISSUER = local_issuer.LOCAL_ISSUER
+        token = local_issuer.mint_token(local_issuer.ROLES['manager'])
+        self.headers = {'Authorization': 'Bearer ' + token}
+        self.client = app.test_client
+
+    def test_drink_created_through_api_is_streamed(self):
+        res = self.client().post('/drinks', headers=self.headers, json={
+            'title': 'Water',
+            'recipe': [{'name': 'Water', 'color': 'blue', 'parts': 1}]
+        })
+        self.assertEqual(res.status_code, 200)
+        res = self.client().post('/drinks', headers=self.headers, json={
+            'title': 'Tea',
+            'recipe': {'name': 'Tea', 'color': 'green', 'parts': 2}
+        })
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/drinks-detail', headers=self.headers)
+        self.assertTrue(res.is_streamed)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual([drink['recipe'] for drink in data['drinks']], [
+            [{'name': 'Water', 'color': 'blue', 'parts': 1}],
+            [{'name': 'Tea', 'color': 'green', 'parts': 2}]
+        ])
+
+    def test_post_drink_recipe_list_or_ingredient(self):
+        res = self.client().post('/drinks', headers=self.headers, json={
+            'title': 'Water',
+            'recipe': [{'name': 'Water', 'color': 'blue', 'parts': 1}]
+        })
+        self.assertEqual(json.loads(res.data)['drinks'][0]['recipe'], [{'name': 'Water', 'color': 'blue', 'parts': 1}])
+        res = self.client().post('/drinks', headers=self.headers, json={
+            'title': 'Tea',
+            'recipe': {'name': 'Tea', 'color': 'green', 'parts': 2}
+        })
+        self.assertEqual(json.loads(res.data)['drinks'][0]['recipe'], [{'name': 'Tea', 'color': 'green', 'parts': 2}])
+
+    def test_422_post_drink_with_malformed_recipe(self):
+        res = self.client().post('/drinks', headers=self.headers, json={
+            'title': 'Nested',
+            'recipe': [[{'name': 'Water', 'color': 'blue', 'parts': 1}]]
+        })
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(json.loads(self.client().get('/drinks').data)['drinks'], [])
+
+    def test_malformed_stored_recipe_is_not_a_truncated_200(self):
+        with app.app_context():
+            Drink(title='Broken', recipe='[[1]]').insert()
+
+        res = self.client().get('/drinks-detail', headers=self.headers)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(json.loads(res.data)['success'], False)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import base64
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+from jose import jwt
+
+from src.auth import auth
+from src.auth.jwks import JWKSKeyStore, AsyncJWKSKeyStore
+from src.auth.token_cache import VerifiedTokenCache
+from src.auth import local_issuer
+
+
+def b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def make_key(kid):
+    private_key = rsa.generate_private_key(65537, 2048, default_backend())
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+    numbers = private_key.public_key().public_numbers()
+    jwk = {
+        'kty': 'RSA',
+        'kid': kid,
+        'use': 'sig',
+        'alg': 'RS256',
+        'n': b64_uint(numbers.n),
+        'e': b64_uint(numbers.e)
+    }
+    return pem, jwk
+
+
+class CountingKeyStore(JWKSKeyStore):
+    """Key store that counts how many times the JWKS was fetched"""
+
+    fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return super().fetch()
+
+
+class JWKSKeyStoreTestCase(unittest.TestCase):
+    """This class represents the JWKS key store test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pem, cls.jwk = make_key('key-1')
+        cls.rotated_pem, cls.rotated_jwk = make_key('key-2')
+
+    def setUp(self):
+        """Serve the JWKS from a local file instead of Auth0."""
+        handle, self.jwks_path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.publish([self.jwk])
+        self.url = 'file://' + self.jwks_path
+
+    def tearDown(self):
+        """Executed after each test"""
+        os.remove(self.jwks_path)
+
+    def publish(self, keys):
+        with open(self.jwks_path, 'w') as jwks_file:
+            json.dump({'keys': keys}, jwks_file)
+
+    def test_keys_are_fetched_once(self):
+        store = CountingKeyStore(self.url)
+
+        for _ in range(10):
+            self.assertEqual(store.get('key-1')['n'], self.jwk['n'])
+        self.assertEqual(store.fetches, 1)
+
+    def test_unknown_kid_forces_refetch(self):
+        store = CountingKeyStore(self.url, min_refetch_interval=0)
+        store.get('key-1')
+        self.publish([self.jwk, self.rotated_jwk])
+
+        self.assertEqual(store.get('key-2')['n'], self.rotated_jwk['n'])
+        self.assertEqual(store.fetches, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        store = CountingKeyStore(self.url, min_refetch_interval=60)
+        store.get('key-1')
+
+        for _ in range(10):
+            self.assertIsNone(store.get('made-up'))
+        self.assertEqual(store.fetches, 1)
+
+    def test_stale_keys_are_served_while_refreshing(self):
+        store = CountingKeyStore(self.url, ttl=0)
+        store.get('key-1')
+        self.publish([self.rotated_jwk])
+
+        # The stale key is still returned, the new set arrives in the background
+        self.assertEqual(store.get('key-1')['n'], self.jwk['n'])
+        for _ in range(100):
+            if store.fetches == 2 and not store._refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual(store.fetches, 2)
+        self.assertEqual(store.get('key-2')['n'], self.rotated_jwk['n'])
+
+    def test_verify_decode_jwt_with_local_jwks(self):
+        self.addCleanup(setattr, auth, 'jwks', auth.jwks)
+        auth.jwks = JWKSKeyStore(self.url)
+        token = jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 60,
+            'permissions': ['get:drinks-detail']
+        }, self.pem.decode('ascii'), algorithm='RS256', headers={'kid': 'key-1'})
+
+        payload = auth.verify_decode_jwt(token)
+        self.assertEqual(payload['permissions'], ['get:drinks-detail'])
+
+
+class SlowJWKSServer(ThreadingHTTPServer):
+    """Local stand-in of the identity provider, answering after delay seconds"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.delay = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), SlowJWKSHandler)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/.well-known/jwks.json'.format(self.server_address[1])
+
+
+class SlowJWKSHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.delay)
+        body = json.dumps({'keys': self.server.keys}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncJWKSKeyStoreTestCase(unittest.TestCase):
+    """This class represents the asynchronous JWKS key store test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pem, cls.jwk = make_key('key-1')
+
+    def setUp(self):
+        """Serve the JWKS from a local server that can be made slow."""
+        self.server = SlowJWKSServer([self.jwk])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        """Executed after each test"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_threads(self, target, count):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+    def test_keys_are_fetched_over_http(self):
+        store = AsyncJWKSKeyStore(self.server.url)
+
+        self.assertEqual(store.get('key-1')['n'], self.jwk['n'])
+        self.assertEqual(store.get('key-1')['n'], self.jwk['n'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        store = AsyncJWKSKeyStore(self.server.url, wait=5)
+        self.server.delay = 0.3
+        keys = []
+
+        self.run_threads(lambda: keys.append(store.get('key-1')), 20)
+        self.assertEqual([key['n'] for key in keys], [self.jwk['n']] * 20)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_slow_provider_falls_back_to_last_known_keys(self):
+        store = AsyncJWKSKeyStore(self.server.url, ttl=0, min_refetch_interval=0, timeout=5, wait=0.2)
+        store.get('key-1')
+        self.server.delay = 2
+
+        start = time.monotonic()
+        self.assertEqual(store.get('key-1')['n'], self.jwk['n'])
+        self.assertIsNone(store.get('key-2'))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_slow_provider_does_not_stall_verification(self):
+        self.addCleanup(setattr, auth, 'jwks', auth.jwks)
+        auth.jwks = AsyncJWKSKeyStore(self.server.url, ttl=0, min_refetch_interval=0, wait=0.2)
+        auth.jwks.get('key-1')
+        self.server.delay = 3
+        tokens = [jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 60,
+            'sub': str(i),
+            'permissions': ['get:drinks-detail']
+        }, self.pem.decode('ascii'), algorithm='RS256', headers={'kid': 'key-1'}) for i in range(8)]
+        verified = []
+
+        def verify():
+            for _ in range(25):
+                for token in tokens:
+                    verified.append(auth.verify_decode_jwt(token))
+
+        # 1600 verifications while every JWKS request takes 3 seconds
+        elapsed = self.run_threads(verify, 8)
+        self.assertEqual(len(verified), 1600)
+        self.assertLess(elapsed, 3)
+        self.assertEqual(self.server.requests, 2)
+
+
+class LocalIssuerTestCase(unittest.TestCase):
+    """This class represents the offline token issuer test case"""
+
+    def setUp(self):
+        """Trust the bundled key pair, as with LOCAL_AUTH=true."""
+        for name in ('jwks', 'JWT_ISSUER'):
+            self.addCleanup(setattr, auth, name, getattr(auth, name))
+        self.addCleanup(auth.verified_tokens.clear)
+        auth.jwks = JWKSKeyStore(local_issuer.LOCAL_JWKS_URL)
+        auth.JWT_ISSUER = local_issuer.LOCAL_ISSUER
+
+        self.app = Flask(__name__)
+
+        @self.app.route('/drinks', methods=['POST'])
+        @auth.requires_auth('post:drinks')
+        def create_drink(payload):
+            return payload['sub']
+
+    def test_minted_token_is_verified(self):
+        token = local_issuer.mint_token(local_issuer.ROLES['manager'], subject='local|manager')
+        res = self.app.test_client().post('/drinks', headers={'Authorization': 'Bearer ' + token})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, b'local|manager')
+
+    def test_minted_token_permissions_are_checked(self):
+        token = local_issuer.mint_token(local_issuer.ROLES['barista'])
+        with self.app.test_request_context(headers={'Authorization': 'Bearer ' + token}):
+            payload = auth.verify_decode_jwt(auth.get_token_auth_header())
+            with self.assertRaises(auth.AuthError) as context:
+                auth.check_permissions('post:drinks', payload)
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_token_from_another_issuer_is_rejected(self):
+        token = local_issuer.mint_token(['post:drinks'], issuer='https://elsewhere/')
+
+        with self.assertRaises(auth.AuthError) as context:
+            auth.verify_decode_jwt(token)
+        self.assertEqual(context.exception.error['code'], 'invalid_claims')
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    """This class represents the verified token cache test case"""
+
+    def setUp(self):
+        self.payload = {
+            'exp': int(time.time()) + 60,
+            'permissions': ['get:drinks-detail', 'post:drinks']
+        }
+
+    def test_cached_payload_is_frozen(self):
+        cache = VerifiedTokenCache()
+        cache.put('token', self.payload)
+        payload = cache.get('token')
+
+        self.assertEqual(payload['permissions'], frozenset(self.payload['permissions']))
+        with self.assertRaises(TypeError):
+            payload['permissions'] = []
+
+    def test_expired_token_is_dropped(self):
+        cache = VerifiedTokenCache()
+        cache.put('token', dict(self.payload, exp=int(time.time()) - 1))
+
+        self.assertIsNone(cache.get('token'))
+
+    def test_token_without_exp_is_not_cached(self):
+        cache = VerifiedTokenCache()
+        cache.put('token', {'permissions': []})
+
+        self.assertIsNone(cache.get('token'))
+
+    def test_least_recently_used_token_is_evicted(self):
+        cache = VerifiedTokenCache(maxsize=2)
+        cache.put('first', self.payload)
+        cache.put('second', self.payload)
+        cache.get('first')
+        cache.put('third', self.payload)
+
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+
+    def test_requires_auth_verifies_each_token_once(self):
+        calls = []
+
+        def verify_decode_jwt(token):
+            calls.append(token)
+            return self.payload
+
+        self.addCleanup(setattr, auth, 'verify_decode_jwt', auth.verify_decode_jwt)
+        self.addCleanup(auth.verified_tokens.clear)
+        auth.verify_decode_jwt = verify_decode_jwt
+
+        app = Flask(__name__)
+
+        @app.route('/drinks-detail')
+        @auth.requires_auth('get:drinks-detail')
+        def drinks_detail(payload):
+            return 'ok'
+
+        client = app.test_client()
+        for _ in range(5):
+            res = client.get('/drinks-detail', headers={'Authorization': 'Bearer same-token'})
+            self.assertEqual(res.status_code, 200)
+        self.assertEqual(calls, ['same-token'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
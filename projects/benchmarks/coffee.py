@@ -0,0 +1,82 @@
+'''
+Benchmark of every coffee shop API route
+
+Seeds synthetic drinks (one per row), then runs the harness with tokens
+minted offline for the manager role (LOCAL_AUTH, see
+src/auth/local_issuer.py), so no Auth0 access is needed
+
+  python projects/benchmarks/coffee.py --rows 1e5 --json coffee.json
+'''
+import os
+import sys
+import json
+import random
+import argparse
+
+COFFEE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '03_coffee_shop_full_stack', 'backend')
+sys.path.insert(0, COFFEE_DIR)
+
+import harness
+
+INGREDIENTS = [('water', 'blue'), ('coffee', 'brown'), ('milk', 'white'), ('foam', 'grey'),
+    ('chocolate', 'black'), ('caramel', 'orange'), ('cream', 'yellow')]
+
+
+def recipe(rng):
+    return [{'name': name, 'color': color, 'parts': rng.randint(1, 3)}
+        for name, color in rng.sample(INGREDIENTS, rng.randint(1, 3))]
+
+
+'''
+setup(args, disposable)
+    imports the app on the database of args and seeds args.rows drinks,
+    then disposable more for the routes deleting a drink per request
+    returns the app
+'''
+def setup(args, disposable=0):
+    # read by src.api and src.auth when they are imported
+    os.environ['DATABASE_URL'] = harness.database_url(args, 'coffee')
+    os.environ['LOCAL_AUTH'] = 'true'
+    from src.api import app
+    from src.database.models import db, Drink
+
+    rng = random.Random(0)
+    drinks = [{'title': 'Drink {}'.format(i + 1), 'recipe': json.dumps(recipe(rng))} for i in range(args.rows)]
+    drinks += [{'title': 'Disposable drink {}'.format(i), 'recipe': json.dumps(recipe(rng))} for i in range(disposable)]
+    for start in range(0, len(drinks), 10000):
+        db.session.execute(Drink.__table__.insert(), drinks[start:start + 10000])
+    db.session.commit()
+    db.session.remove()
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    harness.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    app = setup(args, harness.requests_per_route(args))
+    from src.auth.local_issuer import ROLES, mint_token
+
+    headers = {'Authorization': 'Bearer ' + mint_token(ROLES['manager'], expires_in=86400)}
+    routes = [
+        harness.Route('drinks', 'GET', '/drinks'),
+        harness.Route('drinks_detail', 'GET', '/drinks-detail', headers=headers),
+        harness.Route('drink_create', 'POST', '/drinks', headers=headers, json=lambda i: {
+            'title': 'Benchmark drink {}'.format(i),
+            'recipe': {'name': 'coffee', 'color': 'brown', 'parts': 1}
+        }),
+        harness.Route('drink_patch', 'PATCH', lambda i: '/drinks/{}'.format(i % args.rows + 1), headers=headers,
+            json=lambda i: {'recipe': {'name': 'coffee', 'color': 'brown', 'parts': i % 3 + 1}}),
+        harness.Route('drink_delete', 'DELETE', lambda i: '/drinks/{}'.format(args.rows + i + 1), headers=headers),
+    ]
+
+    results = harness.run(app, routes, args)
+    if args.json:
+        harness.save(args.json, {'coffee': results}, args)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+'''
+Benchmark of every Fyyur route
+
+Seeds venues, artists and shows (one venue and one artist per 20 rows,
+the rest shows) with Fyyur's benchmarks/seed.py, then runs the harness
+
+  python projects/benchmarks/fyyur.py --rows 1e5 --json fyyur.json
+'''
+import os
+import sys
+import argparse
+
+FYYUR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '01_fyyur')
+sys.path.insert(0, FYYUR_DIR)
+
+import harness
+from app import app
+from models import db, Venue, Artist
+from benchmarks.seed import seed
+
+VENUE = {
+    'city': 'San Francisco',
+    'state': 'CA',
+    'address': '1015 Folsom Street',
+    'phone': '123-123-1234',
+    'genres': ['Jazz', 'Folk'],
+    'facebook_link': 'https://www.facebook.com/venue',
+    'website': 'https://example.com/venue',
+}
+ARTIST = {
+    'city': 'San Francisco',
+    'state': 'CA',
+    'phone': '326-123-5000',
+    'genres': ['Jazz'],
+    'facebook_link': 'https://www.facebook.com/artist',
+    'website': 'https://example.com/artist',
+}
+
+
+'''
+disposable(model, count)
+    ids of count new rows of model, without shows, for the routes
+    deleting a row per request
+'''
+def disposable(model, count):
+    rows = [model(name='Disposable {} {}'.format(model.__name__, i), city='Nowhere', state='CA') for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    ids = [row.id for row in rows]
+    db.session.remove()
+    return ids
+
+
+def csv_rows(header, row, count):
+    return lambda number: header + ''.join(row(number, i) for i in range(count))
+
+
+def routes(args, venues, artists):
+    budget = harness.requests_per_route(args)
+    venue_ids = disposable(Venue, budget)
+    artist_ids = disposable(Artist, budget)
+    start_time = '2030-01-01 20:00:00'
+    return [
+        harness.Route('home', 'GET', '/'),
+        harness.Route('venues', 'GET', '/venues'),
+        harness.Route('venues_search', 'POST', '/venues/search', data={'search_term': 'Venue 1'}),
+        harness.Route('venue', 'GET', lambda i: '/venues/{}'.format(i % venues + 1)),
+        harness.Route('venue_create_form', 'GET', '/venues/create'),
+        harness.Route('venue_create', 'POST', '/venues/create',
+            data=lambda i: dict(VENUE, name='Bench Venue {}'.format(i))),
+        harness.Route('venue_edit_form', 'GET', '/venues/1/edit'),
+        harness.Route('venue_edit', 'POST', lambda i: '/venues/{}/edit'.format(i % venues + 1),
+            data=lambda i: dict(VENUE, name='Venue {}'.format(i % venues + 1)), expect=(302,)),
+        harness.Route('venue_delete', 'DELETE', lambda i: '/venues/{}'.format(venue_ids[i])),
+        harness.Route('venues_import', 'POST', '/venues/import', content_type='text/csv',
+            data=csv_rows('name,city,state,address,genres,facebook_link,website\n',
+                lambda number, i: 'Imported Venue {}-{},Boston,MA,1 Main St,Jazz,{},{}\n'.format(
+                    number, i, VENUE['facebook_link'], VENUE['website']), 10)),
+        harness.Route('artists', 'GET', '/artists'),
+        harness.Route('artists_search', 'POST', '/artists/search', data={'search_term': 'Artist 1'}),
+        harness.Route('artist', 'GET', lambda i: '/artists/{}'.format(i % artists + 1)),
+        harness.Route('artist_create_form', 'GET', '/artists/create'),
+        harness.Route('artist_create', 'POST', '/artists/create',
+            data=lambda i: dict(ARTIST, name='Bench Artist {}'.format(i))),
+        harness.Route('artist_edit_form', 'GET', '/artists/1/edit'),
+        harness.Route('artist_edit', 'POST', lambda i: '/artists/{}/edit'.format(i % artists + 1),
+            data=lambda i: dict(ARTIST, name='Artist {}'.format(i % artists + 1)), expect=(302,)),
+        harness.Route('artist_delete', 'DELETE', lambda i: '/artists/{}'.format(artist_ids[i])),
+        harness.Route('artists_import', 'POST', '/artists/import', content_type='text/csv',
+            data=csv_rows('name,city,state,genres,facebook_link,website\n',
+                lambda number, i: 'Imported Artist {}-{},Boston,MA,Jazz,{},{}\n'.format(
+                    number, i, ARTIST['facebook_link'], ARTIST['website']), 10)),
+        harness.Route('shows', 'GET', '/shows'),
+        harness.Route('show_create_form', 'GET', '/shows/create'),
+        harness.Route('show_create', 'POST', '/shows/create', data=lambda i: {
+            'artist_id': i % artists + 1,
+            'venue_id': i % venues + 1,
+            'start_time': start_time
+        }),
+        harness.Route('shows_import', 'POST', '/shows/import', content_type='text/csv',
+            data=csv_rows('artist,venue,start_time\n',
+                lambda number, i: 'Artist {},Venue {},{}\n'.format(
+                    (number + i) % artists + 1, (number * 7 + i) % venues + 1, start_time), 10)),
+        harness.Route('metrics', 'GET', '/_metrics/db'),
+    ]
+
+
+'''
+setup(args)
+    points Fyyur to the database of args and seeds args.rows rows,
+    returns the numbers of venues and artists
+'''
+def setup(args):
+    app.config['SQLALCHEMY_DATABASE_URI'] = harness.database_url(args, 'fyyur')
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['DB_METRICS_ENDPOINT'] = True
+    app.debug = False
+    venues = artists = max(20, args.rows // 20)
+    seed(venues, artists, args.rows - venues - artists)
+    return venues, artists
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    harness.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    venues, artists = setup(args)
+    results = harness.run(app, routes(args, venues, artists), args)
+    if args.json:
+        harness.save(args.json, {'fyyur': results}, args)
+    return results
+
+
+if __name__ == '__main__':
+    main()
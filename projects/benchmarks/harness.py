@@ -0,0 +1,387 @@
+'''
+Benchmark harness shared by fyyur.py, trivia.py and coffee.py
+
+Each route is requested through the Flask test client and through a real
+WSGI server (werkzeug, threaded, HTTP/1.1 keep-alive) on a local port, and
+reported with its requests per second, latency percentiles, SQL
+statements per request and, with the test client, the memory allocated
+per request (tracemalloc)
+
+Results are plain JSON, so a run can be saved as a baseline and diffed
+against later runs with compare()
+'''
+import os
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import tracemalloc
+import http.client
+from urllib.parse import urlencode
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+# Seed sizes accepted by --rows
+MIN_ROWS = 10 ** 3
+MAX_ROWS = 10 ** 6
+DRIVERS = ('client', 'server')
+
+
+'''
+Route(name, method, path, json, data, content_type, headers, expect)
+    a request to benchmark. path, json and data may be callables of the
+    request number, for requests that need a unique payload or consume a
+    row each (creations, deletions)
+    the responses whose status is not in expect are counted as errors
+'''
+class Route:
+    def __init__(self, name, method, path, json=None, data=None, content_type=None, headers=None, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.json = json
+        self.data = data
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.expect = expect
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _value(self, value, number):
+        return value(number) if callable(value) else value
+
+    '''
+    request()
+        (method, path, body, headers) of the next request
+    '''
+    def request(self):
+        with self._lock:
+            number = self._counter
+            self._counter += 1
+        headers = dict(self.headers)
+        body = b''
+        if self.json is not None:
+            body = json.dumps(self._value(self.json, number)).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif self.data is not None:
+            data = self._value(self.data, number)
+            if isinstance(data, dict):
+                body = urlencode(data, doseq=True).encode('utf-8')
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            else:
+                body = data.encode('utf-8') if isinstance(data, str) else data
+                headers['Content-Type'] = self.content_type or 'application/octet-stream'
+        return self.method, self._value(self.path, number), body, headers
+
+
+'''
+requests_per_route(args)
+    requests a route receives in a run, i.e. the rows a route consuming a
+    row per request (a deletion) needs
+'''
+def requests_per_route(args):
+    drivers = parse_drivers(args.drivers)
+    total = 0
+    if 'client' in drivers:
+        total += args.warmup + args.requests + args.allocations
+    if 'server' in drivers:
+        total += args.warmup + args.requests
+    return total
+
+
+def parse_drivers(drivers):
+    drivers = [driver.strip() for driver in drivers.split(',') if driver.strip()]
+    for driver in drivers:
+        if driver not in DRIVERS:
+            raise argparse.ArgumentTypeError('unknown driver {}'.format(driver))
+    return drivers
+
+
+def rows(value):
+    value = int(float(value))
+    if not MIN_ROWS <= value <= MAX_ROWS:
+        raise argparse.ArgumentTypeError('--rows must be between {} and {}'.format(MIN_ROWS, MAX_ROWS))
+    return value
+
+
+def add_arguments(parser):
+    parser.add_argument('--rows', type=rows, default=MIN_ROWS,
+        help='rows seeded, from 1e3 to 1e6 (default 1e3)')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route and driver')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests before measuring')
+    parser.add_argument('--allocations', type=int, default=20,
+        help='requests per route measured again under tracemalloc (test client only)')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent connections to the WSGI server')
+    parser.add_argument('--drivers', default=','.join(DRIVERS), help='client, server or both (default)')
+    parser.add_argument('--route', action='append', default=[], help='only benchmark the routes with this name')
+    parser.add_argument('--database-url', help='database to seed (a temporary SQLite file by default)')
+    parser.add_argument('--json', help='write the results to this file')
+
+
+'''
+database_url(args, name)
+    --database-url, or a new SQLite file in a temporary directory: an
+    in-memory database would not be shared with the server's threads
+'''
+def database_url(args, name):
+    if args.database_url:
+        return args.database_url
+    return 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(prefix='bench-'), name + '.db'))
+
+
+#----------------------------------------------------------------------------#
+# Drivers.
+#----------------------------------------------------------------------------#
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, 'after_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'after_cursor_execute', self._count)
+
+
+def client_call(app):
+    client = app.test_client()
+
+    def call(route):
+        method, path, body, headers = route.request()
+        response = client.open(path, method=method, data=body, headers=headers)
+        response.get_data()
+        return response.status_code
+    return call
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # werkzeug writes the headers and the body separately, which Nagle's
+    # algorithm would delay by the client's delayed ACK (about 40 ms)
+    disable_nagle_algorithm = True
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+'''
+WSGIServer(app)
+    serves app on a free local port from a background thread, one thread
+    per connection, until stop()
+'''
+class WSGIServer:
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def server_call(port):
+    connections = threading.local()
+
+    def call(route):
+        method, path, body, headers = route.request()
+        for attempt in range(2):
+            connection = getattr(connections, 'connection', None)
+            if connection is None:
+                connection = connections.connection = http.client.HTTPConnection('127.0.0.1', port)
+            try:
+                connection.request(method, path, body=body or None, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, socket.error):
+                # the server closed the kept-alive connection
+                connection.close()
+                connections.connection = None
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                connection.close()
+                connections.connection = None
+            return response.status
+    return call
+
+
+#----------------------------------------------------------------------------#
+# Measurements.
+#----------------------------------------------------------------------------#
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def timed(call, route, count, concurrency=1):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            status = call(route)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status not in route.expect:
+                    errors.append(status)
+
+    shares = [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(share,)) for share in shares if share]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def allocations(call, route, count):
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(count):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            call(route)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': round(statistics.median(peaks) / 1024, 1),
+        'alloc_retained_kib': round(statistics.mean(retained) / 1024, 1),
+    }
+
+
+'''
+measure(call, route, args, concurrency)
+    requests route args.warmup times, then args.requests times through
+    call, and returns its statistics
+'''
+def measure(call, route, args, concurrency=1):
+    timed(call, route, args.warmup, concurrency)
+    with QueryCounter() as queries:
+        latencies, errors, seconds = timed(call, route, args.requests, concurrency)
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+        'requests_per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'queries_per_request': round(queries.count / len(latencies), 2),
+    }
+
+
+def report(name, driver, stats):
+    line = '{:<24} {:<6} {:>9.1f} req/s  p50 {:>8.2f}  p90 {:>8.2f}  p99 {:>8.2f} ms  {:>6.1f} queries'.format(
+        name, driver, stats['requests_per_second'], stats['p50_ms'], stats['p90_ms'], stats['p99_ms'],
+        stats['queries_per_request'])
+    if 'alloc_peak_kib' in stats:
+        line += '  {:>8.1f} KiB peak'.format(stats['alloc_peak_kib'])
+    if stats['errors']:
+        line += '  {} errors {}'.format(stats['errors'], stats['error_statuses'])
+    print(line, flush=True)
+
+
+'''
+run(app, routes, args)
+    benchmarks routes against app with every driver of args.drivers and
+    returns {route name: {driver: statistics}}
+'''
+def run(app, routes, args):
+    drivers = parse_drivers(args.drivers)
+    routes = [route for route in routes if not args.route or route.name in args.route]
+    results = {}
+    if 'client' in drivers:
+        call = client_call(app)
+        for route in routes:
+            stats = measure(call, route, args)
+            if args.allocations:
+                stats.update(allocations(call, route, args.allocations))
+            results.setdefault(route.name, {})['client'] = stats
+            report(route.name, 'client', stats)
+    if 'server' in drivers:
+        server = WSGIServer(app)
+        try:
+            call = server_call(server.port)
+            for route in routes:
+                stats = measure(call, route, args, args.concurrency)
+                results.setdefault(route.name, {})['server'] = stats
+                report(route.name, 'server', stats)
+        finally:
+            server.stop()
+    return results
+
+
+'''
+save(path, apps, args)
+    writes the results of apps ({app: {route: {driver: statistics}}}) to
+    path, along with the settings they were measured with
+'''
+def save(path, apps, args):
+    results = {
+        'settings': {name: getattr(args, name) for name in ('rows', 'requests', 'warmup', 'concurrency', 'drivers')},
+        'apps': apps,
+    }
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
+
+
+def load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+#----------------------------------------------------------------------------#
+# Baselines.
+#----------------------------------------------------------------------------#
+
+'''
+compare(baseline, current, tolerance)
+    the regressions of the current results against the baseline ones, as
+    written by save(): more SQL statements per request or more errors,
+    or a p50 latency more than tolerance (a fraction) above the baseline's
+    latencies are only comparable when measured on the same machine
+'''
+def compare(baseline, current, tolerance=0.25):
+    regressions = []
+    for app, routes in sorted(current['apps'].items()):
+        for route, drivers in sorted(routes.items()):
+            for driver, stats in sorted(drivers.items()):
+                before = baseline['apps'].get(app, {}).get(route, {}).get(driver)
+                if before is None:
+                    continue
+                name = '{} {} ({})'.format(app, route, driver)
+                if stats['queries_per_request'] > before['queries_per_request']:
+                    regressions.append('{}: {} queries per request, was {}'.format(
+                        name, stats['queries_per_request'], before['queries_per_request']))
+                if stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                    regressions.append('{}: p50 {:.2f} ms, was {:.2f} ms'.format(
+                        name, stats['p50_ms'], before['p50_ms']))
+                if stats['errors'] > before['errors']:
+                    regressions.append('{}: {} errors, was {}'.format(name, stats['errors'], before['errors']))
+    return regressions
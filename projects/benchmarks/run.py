@@ -0,0 +1,61 @@
+'''
+Runs the Fyyur, trivia and coffee shop benchmarks and gathers their
+results in one JSON file, optionally compared with a baseline
+
+  python projects/benchmarks/run.py --rows 1e4 --json results.json
+  python projects/benchmarks/run.py --rows 1e4 --baseline baseline.json
+
+Each app is benchmarked in its own process, since Fyyur and trivia both
+have a top-level models module, with the options of harness.py
+Exits with status 1 when --baseline is given and a regression is found
+'''
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+import harness
+
+APPS = ('fyyur', 'trivia', 'coffee')
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', action='append', choices=APPS, help='only benchmark this app (repeatable)')
+    parser.add_argument('--baseline', help='results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+        help='p50 latency increase tolerated against the baseline (default 0.25, i.e. 25%%)')
+    harness.add_arguments(parser)
+    args = parser.parse_args()
+
+    options = ['--rows', str(args.rows), '--requests', str(args.requests), '--warmup', str(args.warmup),
+        '--allocations', str(args.allocations), '--concurrency', str(args.concurrency), '--drivers', args.drivers]
+    for route in args.route:
+        options += ['--route', route]
+    if args.database_url:
+        options += ['--database-url', args.database_url]
+
+    apps = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for app in args.app or APPS:
+            print('== {} =='.format(app), flush=True)
+            path = os.path.join(directory, app + '.json')
+            subprocess.run([sys.executable, os.path.join(BENCHMARKS_DIR, app + '.py'), '--json', path] + options,
+                check=True)
+            apps.update(harness.load(path)['apps'])
+
+    if args.json:
+        harness.save(args.json, apps, args)
+    if args.baseline:
+        regressions = harness.compare(harness.load(args.baseline), {'apps': apps}, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('no regression against {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
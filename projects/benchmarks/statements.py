@@ -0,0 +1,167 @@
+'''
+Micro-benchmark of the hot lookups of the repositories (Fyyur's VenueRepo
+and ArtistRepo, trivia's QuestionRepo, the coffee shop's DrinkRepo)
+
+Each lookup runs as the equivalent ORM query, built and compiled on every
+call as the routes did, then through its repository, whose baked query is
+built and compiled once; both run the same SQL. The CPU time per call
+(time.process_time) is the best of --repeat rounds of --calls calls
+
+  python projects/benchmarks/statements.py --rows 1e3 --calls 1000
+
+Each app runs in its own process, like run.py
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import harness
+
+APPS = ('fyyur', 'trivia', 'coffee')
+
+
+'''
+Lookup(name, orm, repo)
+    a lookup done with a query built on each call, orm(i), and through a
+    repository, repo(i), i being the call number
+'''
+class Lookup:
+    def __init__(self, name, orm, repo):
+        self.name = name
+        self.orm = orm
+        self.repo = repo
+
+
+def fyyur_lookups(args):
+    import fyyur
+    from sqlalchemy.orm import joinedload
+    from models import db, Venue, Artist, Show
+    from repos import venue_repo, artist_repo
+
+    venues, artists = fyyur.setup(args)
+    return fyyur.app, db, [
+        Lookup('venue_get',
+            lambda i: Venue.query.options(joinedload(Venue.genres)).get(i % venues + 1),
+            lambda i: venue_repo.get(i % venues + 1)),
+        Lookup('venue_shows',
+            lambda i: Show.query.options(joinedload(Show.artist))
+                .filter(Show.venue_id == i % venues + 1).order_by(Show.start_time).all(),
+            lambda i: venue_repo.shows(i % venues + 1)),
+        Lookup('artist_get',
+            lambda i: Artist.query.options(joinedload(Artist.genres)).get(i % artists + 1),
+            lambda i: artist_repo.get(i % artists + 1)),
+        Lookup('artist_shows',
+            lambda i: Show.query.options(joinedload(Show.venue))
+                .filter(Show.artist_id == i % artists + 1).order_by(Show.start_time).all(),
+            lambda i: artist_repo.shows(i % artists + 1)),
+    ]
+
+
+def trivia_lookups(args):
+    import trivia
+    from models import db, Question
+    from flaskr.repos import question_repo
+
+    app, questions = trivia.setup(args)
+    categories = len(trivia.CATEGORIES)
+    return app, db, [
+        Lookup('question_get',
+            lambda i: Question.query.get(i % questions + 1),
+            lambda i: question_repo.get(i % questions + 1)),
+        Lookup('questions_by_category',
+            lambda i: list(Question.query.filter_by(category=i % categories + 1)
+                .order_by(Question.id).yield_per(100)),
+            lambda i: list(question_repo.by_category(i % categories + 1, 100))),
+    ]
+
+
+def coffee_lookups(args):
+    import coffee
+    app = coffee.setup(args)
+    from src.database.models import db, Drink
+    from src.database.repos import drink_repo
+
+    return app, db, [
+        Lookup('drink_get',
+            lambda i: Drink.query.filter(Drink.id == str(i % args.rows + 1)).one_or_none(),
+            lambda i: drink_repo.get(str(i % args.rows + 1))),
+    ]
+
+
+LOOKUPS = {'fyyur': fyyur_lookups, 'trivia': trivia_lookups, 'coffee': coffee_lookups}
+
+
+'''
+cpu_per_call(call, db, calls)
+    CPU seconds per call of call(i), the session being emptied after each
+    call so lookups by primary key are not answered from it
+'''
+def cpu_per_call(call, db, calls):
+    started = time.process_time()
+    for i in range(calls):
+        call(i)
+        db.session.expunge_all()
+    return (time.process_time() - started) / calls
+
+
+def measure(app, db, lookups, args):
+    results = {}
+    with app.app_context():
+        for lookup in lookups:
+            for call in (lookup.orm, lookup.repo):
+                cpu_per_call(call, db, max(1, args.calls // 10))
+            orm, repo = [], []
+            # rounds alternate so both sides see the same machine load
+            for _ in range(args.repeat):
+                orm.append(cpu_per_call(lookup.orm, db, args.calls))
+                repo.append(cpu_per_call(lookup.repo, db, args.calls))
+            stats = {'orm_cpu_us': min(orm) * 1e6, 'repo_cpu_us': min(repo) * 1e6}
+            stats['cpu_saved'] = 1 - stats['repo_cpu_us'] / stats['orm_cpu_us']
+            print('{:<24} orm {:>9.1f} us  repo {:>9.1f} us  CPU per call {:>+6.1%}'.format(
+                lookup.name, stats['orm_cpu_us'], stats['repo_cpu_us'], -stats['cpu_saved']), flush=True)
+            results[lookup.name] = stats
+        db.session.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', action='append', choices=APPS, help='only benchmark this app (repeatable)')
+    parser.add_argument('--rows', type=harness.rows, default=harness.MIN_ROWS,
+        help='rows seeded, from 1e3 to 1e6 (default 1e3)')
+    parser.add_argument('--calls', type=int, default=1000, help='calls per round and lookup')
+    parser.add_argument('--repeat', type=int, default=3, help='measured rounds, the best one is kept')
+    parser.add_argument('--database-url', help='database to seed (a temporary SQLite file by default)')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    apps = args.app or APPS
+    results = {}
+    if len(apps) == 1:
+        results[apps[0]] = measure(*LOOKUPS[apps[0]](args), args)
+    else:
+        options = ['--rows', str(args.rows), '--calls', str(args.calls), '--repeat', str(args.repeat)]
+        if args.database_url:
+            options += ['--database-url', args.database_url]
+        with tempfile.TemporaryDirectory() as directory:
+            for app in apps:
+                print('== {} =='.format(app), flush=True)
+                path = os.path.join(directory, app + '.json')
+                subprocess.run([sys.executable, __file__, '--app', app, '--json', path] + options, check=True)
+                results.update(harness.load(path)['apps'])
+
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump({
+                'settings': {'rows': args.rows, 'calls': args.calls, 'repeat': args.repeat},
+                'apps': results
+            }, results_file, indent=2, sort_keys=True)
+            results_file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
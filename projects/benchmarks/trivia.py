@@ -0,0 +1,120 @@
+'''
+Benchmark of every trivia API route
+
+Seeds the six categories of trivia.psql and synthetic questions (all the
+rows but the categories), then runs the harness
+
+  python projects/benchmarks/trivia.py --rows 1e5 --json trivia.json
+'''
+import os
+import sys
+import random
+import argparse
+
+TRIVIA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '02_trivia_api', 'backend')
+sys.path.insert(0, TRIVIA_DIR)
+
+import harness
+from flaskr import create_app
+from models import db, Question, Category
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+WORDS = ['what', 'which', 'who', 'river', 'painter', 'planet', 'team', 'movie', 'year',
+    'country', 'largest', 'first', 'famous', 'element', 'album', 'capital', 'ocean', 'war']
+
+
+def insert_chunked(table, rows, chunk_size=10000):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+
+
+'''
+seed(questions, seed)
+    recreates the schema with the categories and count synthetic questions
+    inserted with executemany, bypassing the ORM
+'''
+def seed(questions, seed=0):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    insert_chunked(Category.__table__, [{'id': i + 1, 'type': name} for i, name in enumerate(CATEGORIES)])
+    insert_chunked(Question.__table__, [{
+        'question': '{} {}?'.format(' '.join(rng.sample(WORDS, 5)).capitalize(), i),
+        'answer': 'Answer {}'.format(i),
+        'category': rng.randint(1, len(CATEGORIES)),
+        'difficulty': rng.randint(1, 5)
+    } for i in range(questions)])
+    db.session.commit()
+
+
+def disposable(count):
+    rows = [Question('Disposable question {}?'.format(i), 'Nothing', 1, 1) for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    ids = [row.id for row in rows]
+    db.session.remove()
+    return ids
+
+
+def routes(args, questions):
+    question_ids = disposable(harness.requests_per_route(args))
+    return [
+        harness.Route('categories', 'GET', '/categories'),
+        harness.Route('questions', 'GET', '/questions'),
+        harness.Route('questions_deep_page', 'GET', '/questions?page={}'.format(max(1, questions // 10 // 2))),
+        harness.Route('questions_after', 'GET', '/questions?after={}'.format(questions // 2)),
+        harness.Route('question_delete', 'DELETE', lambda i: '/questions/{}'.format(question_ids[i])),
+        harness.Route('question_create', 'POST', '/questions', json=lambda i: {
+            'question': 'Benchmark question {}?'.format(i),
+            'answer': 'Yes',
+            'difficulty': i % 5 + 1,
+            'category': i % len(CATEGORIES) + 1
+        }),
+        harness.Route('questions_bulk', 'POST', '/questions/bulk', json=lambda i: [{
+            'question': 'Bulk question {}-{}?'.format(i, j),
+            'answer': 'Yes',
+            'difficulty': j % 5 + 1,
+            'category': j % len(CATEGORIES) + 1
+        } for j in range(10)]),
+        harness.Route('questions_export', 'GET', '/questions/export'),
+        harness.Route('questions_search', 'POST', '/questions/search', json={'searchTerm': 'river'}),
+        harness.Route('category_questions', 'GET', lambda i: '/categories/{}/questions'.format(i % len(CATEGORIES))),
+        harness.Route('quiz', 'POST', '/quizzes', json=lambda i: {
+            'previous_questions': list(range(1, 20)),
+            'quiz_category': {'type': 'click' if i % 2 else CATEGORIES[i % len(CATEGORIES)], 'id': i % len(CATEGORIES)}
+        }),
+    ]
+
+
+'''
+setup(args)
+    creates the app on the database of args and seeds args.rows rows,
+    returns the app and the number of questions
+'''
+def setup(args):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': harness.database_url(args, 'trivia')
+    })
+    questions = args.rows - len(CATEGORIES)
+    with app.app_context():
+        seed(questions)
+    return app, questions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    harness.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    app, questions = setup(args)
+    with app.app_context():
+        route_list = routes(args, questions)
+
+    results = harness.run(app, route_list, args)
+    if args.json:
+        harness.save(args.json, {'trivia': results}, args)
+    return results
+
+
+if __name__ == '__main__':
+    main()